@@ -0,0 +1,381 @@
+"""
+Local stand-in for the D&B Direct+ endpoints used by the Client, so throughput can be measured without
+calling the billable plus.dnb.com API.
+
+Serves /v2/token, /v1/match/cleanseMatch, /v1/data/duns/{duns} and the monitoring registration and notification endpoints
+with deterministic response bodies shaped like the real ones, gzip-compressed when the client accepts it.
+Latency, 5xx errors and 429 throttling can be injected.
+
+Run it standalone with `python benchmarks/mock_server.py --port 8080 --latency 0.05`.
+"""
+
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+MOCK_TOKEN = "mock-session-token"
+
+
+def _digest(value: str) -> int:
+    return int(hashlib.sha256(value.encode("utf-8")).hexdigest(), 16)
+
+
+def mock_duns(name: str) -> str:
+    return f"{_digest(name.upper()) % 10**9:09d}"
+
+
+def mock_match_candidate(params: dict) -> dict:
+    """
+    Builds a deterministic cleanseMatch candidate for the inquiry params.
+    """
+    name = params.get("name", "")
+    seed = _digest(name.upper())
+    rng = random.Random(seed)
+    confidence = rng.randint(1, 10)
+
+    return {
+        "displaySequence": 1,
+        "organization": {
+            "duns": mock_duns(name),
+            "primaryName": (
+                name.upper() if rng.random() < 0.5 else f"{name.upper()} LTD"
+            ),
+            "primaryAddress": {
+                "streetAddress": {"line1": params.get("streetAddressLine1")},
+                "addressLocality": {"name": params.get("street&addressLocality")},
+                "addressCountry": {"isoAlpha2Code": params.get("countryISOAlpha2Code")},
+                "postalCode": params.get("postalCode"),
+            },
+            "registrationNumbers": (
+                [{"registrationNumber": str(seed % 10**8)}]
+                if rng.random() < 0.7
+                else []
+            ),
+            "dunsControlStatus": {
+                "operatingStatus": {"description": "Active", "dnbCode": 9074}
+            },
+        },
+        "matchQualityInformation": {
+            "confidenceCode": confidence,
+            "matchGrade": "".join(rng.choice("AABFZ") for _ in range(11)),
+            "matchGradeComponentsCount": rng.randint(6, 11),
+            "matchDataProfile": "".join(
+                rng.choice(("00", "01", "03", "20", "98")) for _ in range(14)
+            ),
+            "nameMatchScore": float(rng.randint(40, 100)),
+            "matchGradeComponents": [],
+            "matchDataProfileComponents": [],
+        },
+    }
+
+
+def mock_data_blocks(duns: str, block_ids: list[str]) -> dict:
+    rng = random.Random(_digest(duns))
+    return {
+        "transactionDetail": {"transactionID": f"mock-{duns}"},
+        "inquiryDetail": {"duns": duns, "blockIDs": block_ids},
+        "blockStatus": [{"blockID": block, "status": "ok"} for block in block_ids],
+        "organization": {
+            "duns": duns,
+            "primaryName": f"COMPANY {duns}",
+            "numberOfEmployees": [
+                {
+                    "value": rng.randint(1, 5000),
+                    "informationScopeDescription": "Consolidated",
+                }
+            ],
+            "industryCodes": [
+                {
+                    "code": str(rng.randint(1000, 9999)),
+                    "typeDescription": "SIC",
+                    "priority": i,
+                }
+                for i in range(1, 4)
+            ],
+            "registeredDetails": {
+                "legalForm": {"description": "Private Limited Company"}
+            },
+        },
+    }
+
+
+class MockDnbServer:
+    """
+    Threaded HTTP server mimicking the D&B endpoints.
+    latency is the mean response delay in seconds (uniformly jittered by +/- 50%),
+    error_rate and throttle_rate are the probabilities of a 500 and of a 429 response.
+    token_errors is the number of upcoming token requests answered with a 503.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        retry_after: float = 0.1,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.registrations: dict[str, set[str]] = {}
+        self.notifications: dict[str, list[dict]] = {}
+        self.pending_notifications: dict[str, list[dict]] = {}
+        self.revoked_keys: set[str] = set()
+        self.key_requests: dict[str, int] = {}
+        self.token_errors = 0
+        self.request_count = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockDnbServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockDnbServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def queue_notifications(self, reg_id: str, notifications: list[dict]) -> None:
+        """
+        Queues notifications to be pulled from the registration.
+        """
+        with self._lock:
+            self.notifications.setdefault(reg_id, []).extend(notifications)
+
+    def _draw(self) -> tuple[float, float]:
+        with self._lock:
+            self.request_count += 1
+            return self._random.random(), self._random.uniform(0.5, 1.5)
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: dict, headers: dict | None = None):
+                payload = json.dumps(body).encode("utf-8")
+                gzipped = "gzip" in self.headers.get("Accept-Encoding", "")
+                if gzipped:
+                    payload = gzip.compress(payload, compresslevel=1)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                if gzipped:
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _error(self, status: int, code: str, message: str, headers=None):
+                self._send(
+                    status,
+                    {"error": {"errorCode": code, "errorMessage": message}},
+                    headers,
+                )
+
+            def _handle(self, method: str):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+
+                draw, jitter = server._draw()
+                if server.latency:
+                    time.sleep(server.latency * jitter)
+
+                url = urlparse(self.path)
+                query = {
+                    name: values[0] for name, values in parse_qs(url.query).items()
+                }
+                parts = [part for part in url.path.split("/") if part]
+
+                if parts == ["v2", "token"] and method == "POST":
+                    with server._lock:
+                        token_error = server.token_errors > 0
+                        server.token_errors -= token_error
+                    if token_error:
+                        return self._error(503, "00002", "Service unavailable.")
+                    key = self._basic_key()
+                    if key is None or key in server.revoked_keys:
+                        return self._error(401, "00040", "Invalid credentials.")
+                    return self._send(
+                        200,
+                        {"access_token": f"{MOCK_TOKEN}:{key}", "expiresIn": 86400},
+                    )
+
+                # Session tokens carry the API key they were issued to, so revoking a key also rejects its tokens
+                authorization = self.headers.get("Authorization") or ""
+                token_prefix = f"Bearer {MOCK_TOKEN}:"
+                key = authorization[len(token_prefix) :]
+                if (
+                    not authorization.startswith(token_prefix)
+                    or key in server.revoked_keys
+                ):
+                    return self._error(401, "00041", "Invalid access token.")
+                with server._lock:
+                    server.key_requests[key] = server.key_requests.get(key, 0) + 1
+                if draw < server.throttle_rate:
+                    return self._error(
+                        429,
+                        "00047",
+                        "Too many requests.",
+                        {"Retry-After": str(server.retry_after)},
+                    )
+                if draw < server.throttle_rate + server.error_rate:
+                    return self._error(500, "00001", "Internal server error.")
+
+                if parts == ["v1", "match", "cleanseMatch"] and method == "GET":
+                    return self._send(
+                        200,
+                        {
+                            "inquiryDetail": query,
+                            "candidatesMatchedQuantity": 1,
+                            "matchCandidates": [mock_match_candidate(query)],
+                        },
+                    )
+
+                if parts[:3] == ["v1", "data", "duns"] and len(parts) == 4:
+                    block_ids = query.get("blockIDs", "").split(",")
+                    return self._send(200, mock_data_blocks(parts[3], block_ids))
+
+                if (
+                    parts[:3] == ["v1", "monitoring", "registrations"]
+                    and len(parts) >= 5
+                ):
+                    return self._monitoring(method, parts[3], parts[4:], query)
+
+                return self._error(404, "00404", "Unknown endpoint.")
+
+            def _basic_key(self) -> str | None:
+                authorization = self.headers.get("Authorization") or ""
+                if not authorization.startswith("Basic "):
+                    return None
+                try:
+                    credentials = base64.b64decode(authorization[6:]).decode("ascii")
+                except ValueError:
+                    return None
+                return credentials.split(":", 1)[0]
+
+            def _monitoring(self, method: str, reg_id: str, parts: list, query: dict):
+                with server._lock:
+                    registered = server.registrations.setdefault(reg_id, set())
+
+                    if parts[0] == "duns" and len(parts) == 2 and method == "POST":
+                        if parts[1] in registered:
+                            return self._error(400, "21012", "DUNS already registered.")
+                        registered.add(parts[1])
+                        return self._send(
+                            200,
+                            {"information": {"code": "21113", "message": "Added."}},
+                        )
+
+                    if parts[0] == "duns" and len(parts) == 2 and method == "DELETE":
+                        if parts[1] not in registered:
+                            return self._error(404, "21019", "DUNS not registered.")
+                        registered.discard(parts[1])
+                        return self._send(
+                            200,
+                            {"information": {"code": "21114", "message": "Removed."}},
+                        )
+
+                    if parts == ["notifications"] and method == "GET":
+                        queued = server.notifications.setdefault(reg_id, [])
+                        count = int(query.get("maxNotifications", 100))
+                        batch, queued[:] = queued[:count], queued[count:]
+                        transaction_id = f"mock-{server.request_count}"
+                        if batch:
+                            server.pending_notifications[transaction_id] = batch
+                        return self._send(
+                            200,
+                            {
+                                "transactionDetail": {"transactionID": transaction_id},
+                                "inquiryDetail": {"reference": reg_id},
+                                "notifications": batch,
+                            },
+                        )
+
+                    if (
+                        parts[0] == "notifications"
+                        and len(parts) == 2
+                        and method == "DELETE"
+                    ):
+                        if server.pending_notifications.pop(parts[1], None) is None:
+                            return self._error(404, "00404", "Unknown transaction.")
+                        return self._send(200, {})
+
+                    if parts == ["subjects"] and method == "GET":
+                        page_number = int(query.get("pageNumber", 1))
+                        page_size = int(query.get("pageSize", 1000))
+                        subjects = sorted(registered)[
+                            (page_number - 1) * page_size : page_number * page_size
+                        ]
+                        return self._send(
+                            200,
+                            {
+                                "pageNumber": page_number,
+                                "pageSize": page_size,
+                                "subjects": [{"duns": duns} for duns in subjects],
+                            },
+                        )
+
+                return self._error(404, "00404", "Unknown endpoint.")
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+            def do_DELETE(self):
+                self._handle("DELETE")
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    mock = MockDnbServer(
+        args.host, args.port, args.latency, args.error_rate, args.throttle_rate
+    )
+    print(f"Serving the D&B stand-in on {mock.url}")
+    try:
+        mock._server.serve_forever()
+    except KeyboardInterrupt:
+        mock.stop()
@@ -0,0 +1,264 @@
+"""
+Reproducible benchmark suite for the D&B client, run against the local stand-in in mock_server.py.
+
+Reports records/sec, p50/p99 request latency and peak driver (Python heap) memory for match_and_cleanse,
+adv_match_and_cleanse, append_data and the monitoring methods, plus a processMatch microbenchmark.
+
+    python benchmarks/run_benchmarks.py --records 2000 --latency 0.05 --max-workers 16
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import timeit
+import tracemalloc
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from client import Client
+from mock_server import MockDnbServer, mock_duns, mock_match_candidate
+
+SPARK_BENCHMARKS = (
+    "match_and_cleanse",
+    "adv_match_and_cleanse",
+    "append_data",
+    "add_to_monitoring",
+    "export_monitoring_registrations",
+    "sync_monitoring",
+    "delete_from_monitoring",
+)
+BENCHMARKS = SPARK_BENCHMARKS + ("processMatch",)
+
+CITIES = ("London", "Manchester", "Leeds", "Amsterdam", "Rotterdam", "Utrecht")
+
+
+def synthetic_suppliers(count: int, seed: int = 42) -> list[dict]:
+    rng = random.Random(seed)
+    return [
+        {
+            "source_id": source_id,
+            "name": f"Supplier {rng.randint(1, count * 10)} Trading",
+            "streetaddress": f"{rng.randint(1, 300)} High Street",
+            "city": rng.choice(CITIES),
+            "state": None,
+            "postal_code": f"AB{rng.randint(1, 99)} {rng.randint(1, 9)}CD",
+            "country": rng.choice(("GB", "NL")),
+        }
+        for source_id in range(1, count + 1)
+    ]
+
+
+def benchmark_client(server: MockDnbServer, spark, latencies: list, **kwargs):
+    """
+    Builds a client pointed at the stand-in that records the latency of every request.
+    """
+    lock = threading.Lock()
+
+    class BenchmarkClient(Client):
+        _api_url = f"{server.url}/v1"
+        _api_auth_url = f"{server.url}/v2/token"
+
+        def _request(self, method, url, *args, **request_kwargs):
+            start = time.perf_counter()
+            try:
+                return super()._request(method, url, *args, **request_kwargs)
+            finally:
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+
+    return BenchmarkClient(spark, "mock-key", "mock-secret", **kwargs)
+
+
+def measure(name: str, records: int, latencies: list, fn) -> dict:
+    """
+    Runs fn once and reports throughput, request latency percentiles and peak Python heap memory.
+    """
+    first_latency = len(latencies)
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    request_latencies = sorted(latencies[first_latency:])
+    percentiles = (
+        statistics.quantiles(request_latencies, n=100, method="inclusive")
+        if len(request_latencies) > 1
+        else request_latencies * 99
+    )
+
+    return {
+        "benchmark": name,
+        "records": records,
+        "seconds": round(elapsed, 3),
+        "records_per_sec": round(records / elapsed, 1) if elapsed else None,
+        "requests": len(request_latencies),
+        "p50_ms": round(percentiles[49] * 1000, 2) if percentiles else None,
+        "p99_ms": round(percentiles[98] * 1000, 2) if percentiles else None,
+        "peak_memory_mb": round(peak / 2**20, 2),
+    }
+
+
+def process_match_benchmark(records: int, repeat: int = 5) -> dict:
+    """
+    Microbenchmark of processMatch on synthetic candidates, no network and no Spark involved.
+    """
+    client = Client(None, "mock-key", "mock-secret")
+    suppliers = synthetic_suppliers(records)
+    candidates = [
+        (mock_match_candidate(client._match_params(supplier)), supplier)
+        for supplier in suppliers
+    ]
+
+    def run():
+        for candidate, supplier in candidates:
+            client.processMatch(candidate, supplier)
+
+    best = min(timeit.repeat(run, number=1, repeat=repeat))
+    return {
+        "benchmark": "processMatch",
+        "records": records,
+        "seconds": round(best, 4),
+        "records_per_sec": round(records / best, 1),
+        "requests": 0,
+        "p50_ms": None,
+        "p99_ms": None,
+        "peak_memory_mb": None,
+    }
+
+
+def run(args) -> list[dict]:
+    results = []
+    selected = args.only or list(BENCHMARKS)
+
+    if "processMatch" in selected:
+        results.append(process_match_benchmark(args.records))
+
+    spark_selected = [name for name in selected if name in SPARK_BENCHMARKS]
+    if not spark_selected:
+        return results
+
+    from pyspark.sql import SparkSession
+
+    spark = (
+        SparkSession.builder.master(args.spark_master)
+        .appName("dnbclient-benchmarks")
+        .getOrCreate()
+    )
+    spark.sparkContext.setLogLevel("ERROR")
+
+    with MockDnbServer(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+    ) as server:
+        latencies = []
+        client = benchmark_client(
+            server,
+            spark,
+            latencies,
+            max_workers=args.max_workers,
+            tps=args.tps,
+            backoff_factor=0.05,
+        )
+        suppliers = synthetic_suppliers(args.records)
+        input_df = spark.createDataFrame(
+            suppliers,
+            schema="source_id long, name string, streetaddress string, city string, "
+            "state string, postal_code string, country string",
+        ).cache()
+        input_df.count()
+        duns_list = sorted({mock_duns(supplier["name"]) for supplier in suppliers})
+        duns_df = spark.createDataFrame(
+            [(duns,) for duns in duns_list], "dnb_duns string"
+        )
+        reg_id = "benchmark"
+
+        cases = {
+            "match_and_cleanse": (
+                len(suppliers),
+                lambda: client.match_and_cleanse(input_df).count(),
+            ),
+            "adv_match_and_cleanse": (
+                len(suppliers),
+                lambda: client.adv_match_and_cleanse(input_df).count(),
+            ),
+            "append_data": (
+                len(duns_list),
+                lambda: client.append_data(
+                    duns_df, blocks=["companyinfo_L2_v1"]
+                ).count(),
+            ),
+            "add_to_monitoring": (
+                len(duns_list),
+                lambda: client.add_to_monitoring(duns_list, reg_id),
+            ),
+            "export_monitoring_registrations": (
+                len(duns_list),
+                lambda: client.export_monitoring_registrations(reg_id).count(),
+            ),
+            "sync_monitoring": (
+                len(duns_list),
+                lambda: client.sync_monitoring(
+                    reg_id, duns_df.limit(len(duns_list) // 2)
+                ).count(),
+            ),
+            "delete_from_monitoring": (
+                len(duns_list),
+                lambda: client.delete_from_monitoring(duns_list, reg_id),
+            ),
+        }
+
+        for name in SPARK_BENCHMARKS:
+            if name in spark_selected:
+                records, fn = cases[name]
+                results.append(measure(name, records, latencies, fn))
+
+    spark.stop()
+    return results
+
+
+def print_table(results: list[dict]) -> None:
+    columns = list(results[0].keys())
+    widths = {
+        column: max(len(column), *(len(str(result[column])) for result in results))
+        for column in columns
+    }
+    print("  ".join(column.ljust(widths[column]) for column in columns))
+    for result in results:
+        print(
+            "  ".join(str(result[column]).ljust(widths[column]) for column in columns)
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=1000)
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="Mean mock latency in seconds."
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--max-workers", type=int, default=1)
+    parser.add_argument("--tps", type=float, default=None)
+    parser.add_argument("--spark-master", default="local[*]")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS)
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    results = run(args)
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
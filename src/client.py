@@ -1,255 +1,3242 @@
-from attrs import frozen
+import importlib
+import importlib.util
 import json
+import asyncio
 import base64
+import hashlib
+import itertools
+import random
+import re
+import sqlite3
 import time
 import urllib
-from datetime import date
-from pyspark.sql import SparkSession
-from pyspark.sql.types import *
+import zlib
+from datetime import date, datetime, timezone
 import logging
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import ClassVar
+from email.utils import parsedate_to_datetime
+from functools import partial
+from typing import TYPE_CHECKING, ClassVar
+
+if TYPE_CHECKING:
+    from pyspark.sql import SparkSession
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+
+class _LazyImport:
+    """
+    Stand-in for a module, or an attribute of one, that is only imported on first use.
+    pyspark is loaded this way so the Spark-free methods never pay its import cost.
+    """
+
+    def __init__(self, module: str, attribute: str | None = None):
+        self._module = module
+        self._attribute = attribute
+        self._target = None
+
+    def _load(self):
+        if self._target is None:
+            target = importlib.import_module(self._module)
+            if self._attribute is not None:
+                target = getattr(target, self._attribute)
+            self._target = target
+        return self._target
+
+    def __getattr__(self, name: str):
+        return getattr(self._load(), name)
+
+
+F = _LazyImport("pyspark.sql.functions")
+T = _LazyImport("pyspark.sql.types")
+Window = _LazyImport("pyspark.sql.window", "Window")
+
+
+class _LazySchema:
+    """
+    Class attribute holding a Spark schema as (name, type[, nullable]) tuples,
+    the StructType is built from pyspark.sql.types the first time it is read.
+    """
+
+    _types = {
+        "binary": "BinaryType",
+        "boolean": "BooleanType",
+        "date": "DateType",
+        "double": "DoubleType",
+        "float": "FloatType",
+        "int": "IntegerType",
+        "long": "LongType",
+        "string": "StringType",
+        "timestamp": "TimestampType",
+    }
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self._schema = None
+
+    @classmethod
+    def _data_type(cls, type_name: str):
+        if type_name.startswith("array<") and type_name.endswith(">"):
+            return T.ArrayType(cls._data_type(type_name[6:-1]))
+        return getattr(T, cls._types[type_name])()
+
+    def __get__(self, instance, owner=None):
+        if self._schema is None:
+            self._schema = T.StructType(
+                [
+                    T.StructField(name, self._data_type(type_name), *nullable)
+                    for name, type_name, *nullable in self.fields
+                ]
+            )
+        return self._schema
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket used to keep the client under the D&B transactions-per-second quota.
+    A throttled (429) response halves the refill rate and pauses the bucket, the rate then recovers
+    gradually with every successful call.
+    """
+
+    def __init__(
+        self, rate: float, capacity: float | None = None, min_rate: float = 0.1
+    ):
+        if rate <= 0:
+            raise ValueError(
+                "The rate limit needs to be a positive number of requests per second."
+            )
+
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """
+        Takes one token and returns how many seconds the caller has to wait before using it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate, self._paused_until - now)
+
+    def acquire(self) -> float:
+        """
+        Blocks until a token is available and returns the seconds spent waiting.
+        """
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self) -> float:
+        """
+        Waits without blocking the event loop until a token is available and returns the seconds spent waiting.
+        """
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def backoff(self, retry_after: float | None = None) -> None:
+        """
+        Called on a throttled response, slows the bucket down and pauses it for retry_after seconds.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+            pause = retry_after if retry_after is not None else 1 / self.rate
+            self._paused_until = max(self._paused_until, now + pause)
+
+    def success(self) -> None:
+        """
+        Called on a successful response, recovers the rate additively up to the configured quota.
+        """
+        if self.rate < self.max_rate:
+            with self._lock:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class MetricsHook:
+    """
+    Instrumentation interface of the Client. Every event is a no-op here, subclass it and override the events to
+    forward to Prometheus, OpenTelemetry or a log. The events are called from the worker threads, so implementations
+    need to be thread-safe.
+    """
+
+    def request(
+        self,
+        endpoint: str,
+        method: str,
+        status_code: int | None,
+        seconds: float,
+        error_code: str | None,
+    ) -> None:
+        """
+        One HTTP attempt against an endpoint, status_code is None when the connection failed.
+        """
+
+    def retry(self, endpoint: str, reason: str, attempt: int) -> None:
+        """
+        A request is retried, reason is the status code or the connection error class.
+        """
+
+    def throttle_wait(self, endpoint: str, seconds: float) -> None:
+        """
+        Time spent waiting on the client rate limiter before a request.
+        """
+
+    def token_refresh(self, seconds: float, success: bool) -> None:
+        """
+        A session token was fetched from the token endpoint.
+        """
+
+    def timing(self, name: str, seconds: float) -> None:
+        """
+        Duration of a client-side stage such as processMatch or createDataFrame.
+        """
+
+
+class InMemoryMetrics(MetricsHook):
+    """
+    MetricsHook that aggregates the events in memory, handy in notebooks and benchmarks.
+    Latencies are kept in histograms with the bucket upper bounds in seconds.
+    """
+
+    buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf"))
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.status_codes = {}
+        self.error_codes = {}
+        self.retries = {}
+        self.throttle_seconds = 0.0
+        self.token_refreshes = 0
+        self.latency_histograms = {}
+        self.timings = {}
+
+    def _observe(self, name: str, seconds: float) -> None:
+        histogram = self.latency_histograms.setdefault(name, [0] * len(self.buckets))
+        histogram[
+            next(i for i, bound in enumerate(self.buckets) if seconds <= bound)
+        ] += 1
+
+    def request(self, endpoint, method, status_code, seconds, error_code) -> None:
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            status_key = (endpoint, status_code)
+            self.status_codes[status_key] = self.status_codes.get(status_key, 0) + 1
+            if error_code is not None:
+                error_key = (endpoint, error_code)
+                self.error_codes[error_key] = self.error_codes.get(error_key, 0) + 1
+            self._observe(endpoint, seconds)
+
+    def retry(self, endpoint, reason, attempt) -> None:
+        with self._lock:
+            retry_key = (endpoint, reason)
+            self.retries[retry_key] = self.retries.get(retry_key, 0) + 1
+
+    def throttle_wait(self, endpoint, seconds) -> None:
+        with self._lock:
+            self.throttle_seconds += seconds
+
+    def token_refresh(self, seconds, success) -> None:
+        with self._lock:
+            self.token_refreshes += 1
+            self._observe("token", seconds)
+
+    def timing(self, name, seconds) -> None:
+        with self._lock:
+            count, total = self.timings.get(name, (0, 0.0))
+            self.timings[name] = (count + 1, total + seconds)
+
+
+class DnbAuthError(Exception):
+    """
+    Raised when the client could not authenticate to the D&B API with its credentials.
+    """
+
+
+class TokenProvider:
+    """
+    Holds the D&B session token. The token is fetched on first use and refreshed refresh_margin seconds
+    before it expires, or halfway through its lifetime when that is shorter. Concurrent callers share a single
+    refresh instead of all calling the token endpoint.
+    fetch is called without arguments and returns the token response JSON.
+    """
+
+    def __init__(self, fetch, refresh_margin: float = 300):
+        self._fetch = fetch
+        self.refresh_margin = refresh_margin
+        self._token = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def _valid(self) -> bool:
+        return self._token is not None and time.monotonic() < self._expires_at
+
+    def token(self) -> str:
+        if not self._valid():
+            with self._lock:
+                if not self._valid():
+                    self._refresh()
+        return self._token
+
+    def invalidate(self, token: str) -> None:
+        """
+        Drops token after it was rejected, unless another caller already replaced it.
+        """
+        with self._lock:
+            if self._token == token:
+                self._token = None
+
+    def _refresh(self) -> None:
+        response = self._fetch()
+        token = response.get("access_token")
+        if not token:
+            raise DnbAuthError(
+                "We could not authenticate to the D&B API. Please check your credentials."
+            )
+        expires_in = float(response.get("expiresIn", response.get("expires_in", 0)))
+        # Short-lived tokens are refreshed halfway through rather than right away
+        margin = min(self.refresh_margin, expires_in / 2)
+        lifetime = expires_in - margin if expires_in else 3600
+        self._token = token
+        self._expires_at = time.monotonic() + lifetime
+
+
+class Credential:
+    """
+    One API key of a credential pool, with its own session token and rate budget.
+    """
+
+    def __init__(
+        self, key: str, auth_token: str, rate_limiter: TokenBucket | None = None
+    ):
+        self.key = key
+        self.auth_token = auth_token
+        self.rate_limiter = rate_limiter
+        self.token_provider = None
+        self.in_flight = 0
+        self.last_used = 0.0
+        self.available_at = 0.0
+        self.revoked = False
+
+    @property
+    def name(self) -> str:
+        return f"{self.key[:4]}..."
+
+
+class CredentialPool:
+    """
+    Schedules requests over the credentials of a client. Each request goes to the available credential with the fewest
+    requests in flight, the least recently used one on a tie. A throttled credential is taken out of rotation until
+    its cool-down has passed and a revoked one for good.
+    """
+
+    def __init__(self, credentials):
+        self.credentials = list(credentials)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.credentials)
+
+    def _select(self) -> tuple[Credential | None, float]:
+        with self._lock:
+            now = time.monotonic()
+            active = [
+                credential for credential in self.credentials if not credential.revoked
+            ]
+            if not active:
+                raise DnbAuthError(
+                    "All D&B API credentials were rejected. Please check your credentials."
+                )
+            ready = [
+                credential for credential in active if credential.available_at <= now
+            ]
+            if not ready:
+                return None, min(credential.available_at for credential in active) - now
+
+            credential = min(
+                ready,
+                key=lambda credential: (credential.in_flight, credential.last_used),
+            )
+            credential.in_flight += 1
+            credential.last_used = now
+            return credential, 0.0
+
+    def checkout(self) -> Credential:
+        """
+        Returns the credential to send the next request with, waiting while every credential is cooling down.
+        Every checkout is matched by a release.
+        """
+        while True:
+            credential, wait = self._select()
+            if credential is not None:
+                return credential
+            time.sleep(wait)
+
+    async def acheckout(self) -> Credential:
+        while True:
+            credential, wait = self._select()
+            if credential is not None:
+                return credential
+            await asyncio.sleep(wait)
+
+    def release(self, credential: Credential) -> None:
+        with self._lock:
+            credential.in_flight -= 1
+
+    def throttled(self, credential: Credential, seconds: float) -> None:
+        """
+        Takes a throttled credential out of rotation for seconds.
+        """
+        with self._lock:
+            credential.available_at = max(
+                credential.available_at, time.monotonic() + seconds
+            )
+
+    def revoke(self, credential: Credential) -> bool:
+        """
+        Takes a rejected credential out of rotation for good, unless it is the last one left.
+        Returns whether it was revoked.
+        """
+        with self._lock:
+            others = [
+                other
+                for other in self.credentials
+                if other is not credential and not other.revoked
+            ]
+            if others:
+                credential.revoked = True
+            return bool(others)
+
+
+class DnbApiError(Exception):
+    """
+    Raised when the D&B API returns an error response that could not be recovered by retrying.
+    """
+
+    def __init__(self, status_code: int, error_code: str | None, message: str):
+        super().__init__(f"D&B API error {status_code} ({error_code}): {message}")
+        self.status_code = status_code
+        self.error_code = error_code
+        self.message = message
+
+    @classmethod
+    def from_response(cls, response) -> "DnbApiError":
+        try:
+            error = response.json().get("error", {})
+        except ValueError:
+            error = {}
+        return cls(
+            response.status_code,
+            error.get("errorCode"),
+            error.get(
+                "errorMessage",
+                getattr(response, "reason", None)
+                or getattr(response, "reason_phrase", ""),
+            ),
+        )
+
+
+_RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+# Token endpoint statuses that reject the credential itself, see Client._request
+_AUTH_REJECTED_STATUS_CODES = frozenset({400, 401, 403})
+
+# Brotli is only advertised when a decoder is installed, requests and httpx decode the body transparently
+_ACCEPT_ENCODING = (
+    "gzip, deflate, br"
+    if any(importlib.util.find_spec(name) for name in ("brotli", "brotlicffi"))
+    else "gzip, deflate"
+)
+
+# Fields of a cleanseMatch response read by the match records, processMatch and the match index.
+# A nested dict selects keys, a one-element list applies its spec to every item and True keeps the whole value.
+MATCH_RESPONSE_FIELDS = {
+    "matchCandidates": [
+        {
+            "organization": {
+                "duns": True,
+                "primaryName": True,
+                "primaryAddress": {
+                    "streetAddress": {"line1": True},
+                    "addressLocality": {"name": True},
+                    "addressCountry": {"isoAlpha2Code": True},
+                    "postalCode": True,
+                },
+                "dunsControlStatus": {"operatingStatus": {"description": True}},
+                "registrationNumbers": True,
+            },
+            "matchQualityInformation": {
+                "confidenceCode": True,
+                "nameMatchScore": True,
+                "matchGrade": True,
+                "matchGradeComponentsCount": True,
+                "matchDataProfile": True,
+                "matchGradeComponents": True,
+                "matchDataProfileComponents": True,
+            },
+        }
+    ]
+}
+
+
+def _loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def _materialize(value):
+    if hasattr(value, "as_dict"):
+        return value.as_dict()
+    if hasattr(value, "as_list"):
+        return value.as_list()
+    return value
+
+
+def _compile_projection(spec):
+    """
+    Turns a projection spec into a function that copies only the selected fields of a parsed document.
+    Works on plain dicts and lists as well as on lazily parsed simdjson documents.
+    """
+    if spec is True:
+        return _materialize
+
+    if isinstance(spec, list):
+        project_item = _compile_projection(spec[0])
+
+        def project_items(value):
+            if value is None or isinstance(value, (str, int, float)):
+                return value
+            if hasattr(value, "keys"):
+                return _materialize(value)
+            return [project_item(item) for item in value]
+
+        return project_items
+
+    fields = [(key, _compile_projection(sub_spec)) for key, sub_spec in spec.items()]
+
+    def project_fields(value):
+        if not hasattr(value, "keys"):
+            return _materialize(value)
+        return {key: project(value[key]) for key, project in fields if key in value}
+
+    return project_fields
+
+
+_MATCH_PROJECTION = _compile_projection(MATCH_RESPONSE_FIELDS)
+_parsers = threading.local()
+
+
+def _parse_response(response, projection=None):
+    """
+    Parses a response body with the fastest JSON backend installed. With a projection and simdjson installed
+    the document is parsed lazily and only the projected fields are turned into Python objects.
+    """
+    body = response.content
+    if projection is None:
+        return _loads(body)
+    if simdjson is None:
+        return projection(_loads(body))
+
+    parser = getattr(_parsers, "parser", None)
+    if parser is None:
+        parser = _parsers.parser = simdjson.Parser()
+    try:
+        document = parser.parse(body)
+    except RuntimeError:
+        # A parser cannot be reused while objects of its previous document are still referenced
+        parser = _parsers.parser = simdjson.Parser()
+        document = parser.parse(body)
+    return projection(document)
+
+
+# Layout of the match results, see Client.schema and Client.match_records
+MATCH_FIELDS = (
+    ("update_date", "date"),
+    ("accepted", "boolean"),
+    ("input_id", "long"),
+    ("input_company_name", "string"),
+    ("input_streetaddress", "string"),
+    ("input_city", "string"),
+    ("input_country", "string"),
+    ("dnb_duns", "string"),
+    ("dnb_name", "string"),
+    ("dnb_nameMatchScore", "double"),
+    ("dnb_status", "string"),
+    ("dnb_streetaddress", "string"),
+    ("dnb_city", "string"),
+    ("dnb_country", "string"),
+    ("dnb_confidenceCode", "long"),
+    ("MG_Name", "string"),
+    ("MG_StreetNumber", "string"),
+    ("MG_StreetName", "string"),
+    ("MG_City", "string"),
+    ("MG_State", "string"),
+    ("MG_PObox", "string"),
+    ("MG_Phone", "string"),
+    ("MG_PostCode", "string"),
+    ("MG_Density", "string"),
+    ("MG_Uniqueness", "string"),
+    ("MG_SIC", "string"),
+    ("MDP_Name", "string"),
+    ("MDP_StreetNumber", "string"),
+    ("MDP_StreetName", "string"),
+    ("MDP_City", "string"),
+    ("MDP_State", "string"),
+    ("MDP_PObox", "string"),
+    ("MDP_Phone", "string"),
+    ("MDP_PostCode", "string"),
+    ("MDP_DUNS", "string"),
+    ("MDP_SIC", "string"),
+    ("MDP_Density", "string"),
+    ("MDP_Uniqueness", "string"),
+    ("MDP_NationalID", "string"),
+    ("MDP_URL", "string"),
+    ("nameMatchScore", "double"),
+    ("matchGradeComponentsCount", "int"),
+    ("confidenceCode", "int"),
+    ("isPrimary", "boolean"),
+    ("phoneMatch", "boolean"),
+    ("isExec", "boolean"),
+    ("urlMatch", "boolean"),
+    ("exactName", "boolean"),
+    ("strongName", "boolean"),
+    ("closeName", "boolean"),
+    ("regNoMatch", "boolean"),
+    ("isRegistered", "boolean"),
+    ("postCodeMatch", "boolean"),
+    ("addressMatchStrong", "boolean"),
+    ("addressMatchLoose", "boolean"),
+    ("customMatchGrade", "string"),  # [Todo]change name to match summary
+)
+
+ARCHIVE_FIELDS = (
+    ("source_id", "long"),
+    ("request_hash", "string"),
+    ("input", "string"),
+    ("response", "binary"),
+    ("archived_at", "timestamp"),
+)
+
+NOTIFICATION_FIELDS = (
+    ("transaction_id", "string"),
+    ("duns", "string"),
+    ("type", "string"),
+    ("elements", "string"),
+    ("delivered_at", "string"),
+)
+
+# Component names of the matchGrade string, one character each
+MATCH_GRADE_KEYS = (
+    "MG_Name",
+    "MG_StreetNumber",
+    "MG_StreetName",
+    "MG_City",
+    "MG_State",
+    "MG_PObox",
+    "MG_Phone",
+    "MG_PostCode",
+    "MG_Density",
+    "MG_Uniqueness",
+    "MG_SIC",
+)
+
+# Component names of the matchDataProfile string, two characters each
+MATCH_DATA_PROFILE_KEYS = (
+    "MDP_Name",
+    "MDP_StreetNumber",
+    "MDP_StreetName",
+    "MDP_City",
+    "MDP_State",
+    "MDP_PObox",
+    "MDP_Phone",
+    "MDP_PostCode",
+    "MDP_DUNS",
+    "MDP_SIC",
+    "MDP_Density",
+    "MDP_Uniqueness",
+    "MDP_NationalID",
+    "MDP_URL",
+)
+MATCH_DATA_PROFILE_SLICES = tuple(
+    (2 * i, key) for i, key in enumerate(MATCH_DATA_PROFILE_KEYS)
+)
+
+# Legal-form suffixes dropped from company names when normalizing input for deduplication
+LEGAL_FORM_SUFFIXES = (
+    "LIMITED",
+    "LTD",
+    "PLC",
+    "LLC",
+    "LLP",
+    "INC",
+    "INCORPORATED",
+    "CORP",
+    "CORPORATION",
+    "CO",
+    "COMPANY",
+    "GMBH",
+    "AG",
+    "KG",
+    "BV",
+    "NV",
+    "SA",
+    "SAS",
+    "SARL",
+    "SPA",
+    "SRL",
+    "AB",
+    "AS",
+    "OY",
+    "PTY",
+)
+
+# Country names commonly found in ERP extracts mapped to their ISO alpha-2 code
+COUNTRY_CODES = {
+    "UNITED KINGDOM": "GB",
+    "GREAT BRITAIN": "GB",
+    "UK": "GB",
+    "ENGLAND": "GB",
+    "SCOTLAND": "GB",
+    "WALES": "GB",
+    "NETHERLANDS": "NL",
+    "THE NETHERLANDS": "NL",
+    "HOLLAND": "NL",
+    "UNITED STATES": "US",
+    "UNITED STATES OF AMERICA": "US",
+    "USA": "US",
+    "GERMANY": "DE",
+    "DEUTSCHLAND": "DE",
+    "FRANCE": "FR",
+    "BELGIUM": "BE",
+    "IRELAND": "IE",
+    "SPAIN": "ES",
+    "ITALY": "IT",
+}
+
+# Monitoring notification elements mirrored in the match results, mapped to their Client.schema column
+MATCH_NOTIFICATION_ELEMENTS = {
+    "organization.primaryName": "dnb_name",
+    "organization.primaryAddress.streetAddress.line1": "dnb_streetaddress",
+    "organization.primaryAddress.addressLocality.name": "dnb_city",
+    "organization.primaryAddress.addressCountry.isoAlpha2Code": "dnb_country",
+    "organization.dunsControlStatus.operatingStatus.description": "dnb_status",
+}
+
+# Notification types after which the Data Blocks of a DUNS are fetched again
+REFRESH_NOTIFICATION_TYPES = frozenset({"UPDATE", "SEED", "UNDELETE"})
+
+
+def _row_id(row):
+    """
+    Returns a printable identifier of an input row for log messages.
+    """
+    try:
+        return row["source_id"]
+    except (KeyError, IndexError, TypeError, ValueError):
+        return repr(row)
+
+
+def _error_code(response) -> str | None:
+    """
+    Returns the D&B error code of an error response, None for successful responses.
+    """
+    if response.status_code < 400:
+        return None
+    try:
+        return _optional_str(response.json().get("error", {}).get("errorCode"))
+    except (ValueError, AttributeError):
+        return None
+
+
+def _retry_after(response) -> float | None:
+    """
+    Parses the Retry-After header of a response, which is either a number of seconds or an HTTP date.
+    """
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _cache_key(endpoint: str, params: dict) -> str:
+    """
+    Builds a cache key from the normalized request params so that differences in case and
+    whitespace of the input do not cause an extra billable call.
+    """
+    normalized = {
+        name: " ".join(value.casefold().split()) if isinstance(value, str) else value
+        for name, value in params.items()
+    }
+    payload = json.dumps([endpoint, normalized], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MatchCache:
+    """
+    Base class of the persistent response caches placed in front of match_dnb.
+    Entries older than ttl seconds are reported as stale and fetched again, the backends evict the least
+    recently stored entries once more than max_entries are held.
+    Subclasses implement _get, _put and optionally flush and prefetch.
+    """
+
+    def __init__(self, ttl: float | None = None, max_entries: int | None = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self._stats_lock = threading.Lock()
+
+    def _get(self, key: str) -> tuple[str, float] | None:
+        raise NotImplementedError
+
+    def _put(self, key: str, value: str, stored_at: float) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """
+        Persists buffered entries, a no-op for backends that write through.
+        """
+
+    def prefetch(self, keys) -> None:
+        """
+        Loads the entries of keys ahead of their lookups, a no-op for backends that look keys up directly.
+        """
+
+    def lookup(self, key: str):
+        """
+        Returns the cached response for key, or None when it is missing or older than the ttl.
+        """
+        entry = self.lookup_entry(key)
+        return entry[0] if entry is not None else None
+
+    def lookup_entry(self, key: str) -> tuple | None:
+        """
+        Like lookup, but returns the cached response together with the time it was stored.
+        """
+        entry = self._get(key)
+        with self._stats_lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            value, stored_at = entry
+            if self.ttl is not None and time.time() - stored_at > self.ttl:
+                self.stale += 1
+                return None
+            self.hits += 1
+        return json.loads(value), stored_at
+
+    def store(self, key: str, response) -> None:
+        self._put(key, json.dumps(response), time.time())
+
+    def store_body(self, key: str, body: bytes | str) -> None:
+        """
+        Stores a response from its raw JSON body, without parsing it again.
+        """
+        if isinstance(body, bytes):
+            body = body.decode("utf-8")
+        self._put(key, body, time.time())
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {"hits": self.hits, "misses": self.misses, "stale": self.stale}
+
+
+class SQLiteMatchCache(MatchCache):
+    """
+    Match cache stored in a local SQLite file, safe to share between the worker threads of a client.
+    """
+
+    def __init__(
+        self, path: str, ttl: float | None = None, max_entries: int | None = None
+    ):
+        super().__init__(ttl, max_entries)
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS match_cache "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS match_cache_stored_at ON match_cache (stored_at)"
+        )
+        self._connection.commit()
+        self._size = self._connection.execute(
+            "SELECT COUNT(*) FROM match_cache"
+        ).fetchone()[0]
+
+    def _get(self, key: str) -> tuple[str, float] | None:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT value, stored_at FROM match_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+    def _put(self, key: str, value: str, stored_at: float) -> None:
+        with self._lock:
+            inserted = self._connection.execute(
+                "INSERT OR IGNORE INTO match_cache VALUES (?, ?, ?)",
+                (key, value, stored_at),
+            ).rowcount
+            if not inserted:
+                self._connection.execute(
+                    "UPDATE match_cache SET value = ?, stored_at = ? WHERE key = ?",
+                    (value, stored_at, key),
+                )
+            self._size += inserted
+
+            if self.max_entries is not None and self._size > self.max_entries:
+                self._connection.execute(
+                    "DELETE FROM match_cache WHERE key IN "
+                    "(SELECT key FROM match_cache ORDER BY stored_at LIMIT ?)",
+                    (self._size - self.max_entries,),
+                )
+                self._size = self.max_entries
+            self._connection.commit()
+
+
+class TableMatchCache(MatchCache):
+    """
+    Match cache stored in a Delta or Parquet table. Entries are read from the table as they are looked up,
+    a whole run at a time through prefetch, and new entries are buffered until flush adds them to the table:
+    merged on the key into Delta tables, appended to other formats, where the latest entry of a key wins.
+    On Delta tables flush also deletes the expired and evicted entries.
+    """
+
+    def __init__(
+        self,
+        spark: "SparkSession",
+        path: str,
+        format: str = "delta",
+        ttl: float | None = None,
+        max_entries: int | None = None,
+    ):
+        super().__init__(ttl, max_entries)
+        self.spark = spark
+        self.path = path
+        self.format = format
+        # Entries read so far, None for keys known to be missing from the table
+        self._entries = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    schema = _LazySchema(
+        [
+            ("key", "string", False),
+            ("value", "string", False),
+            ("stored_at", "double", False),
+        ]
+    )
+
+    def _read(self, keys) -> None:
+        keys = list({key for key in keys if key not in self._entries})
+        if not keys:
+            return
+        try:
+            table = self.spark.read.format(self.format).load(self.path)
+        except Exception:
+            # The table does not exist yet, it is created by the first flush
+            table = None
+
+        found = {}
+        if table is not None:
+            wanted = self.spark.createDataFrame([(key,) for key in keys], "key string")
+            for row in table.join(F.broadcast(wanted), "key").collect():
+                current = found.get(row["key"])
+                if current is None or row["stored_at"] > current[1]:
+                    found[row["key"]] = (row["value"], row["stored_at"])
+        for key in keys:
+            self._entries[key] = found.get(key)
+
+    def prefetch(self, keys) -> None:
+        with self._lock:
+            self._read(keys)
+
+    def _get(self, key: str) -> tuple[str, float] | None:
+        with self._lock:
+            self._read([key])
+            return self._entries[key]
+
+    def _put(self, key: str, value: str, stored_at: float) -> None:
+        with self._lock:
+            self._entries[key] = self._pending[key] = (value, stored_at)
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._pending:
+                return
+            updates_df = self.spark.createDataFrame(
+                [
+                    (key, value, stored_at)
+                    for key, (value, stored_at) in self._pending.items()
+                ],
+                schema=self.schema,
+            )
+
+            if self.format != "delta":
+                updates_df.write.format(self.format).mode("append").save(self.path)
+                self._pending = {}
+                return
+
+            from delta.tables import DeltaTable
+
+            if not DeltaTable.isDeltaTable(self.spark, self.path):
+                updates_df.write.format("delta").mode("append").save(self.path)
+            else:
+                (
+                    DeltaTable.forPath(self.spark, self.path)
+                    .alias("cache")
+                    .merge(updates_df.alias("updates"), "cache.key = updates.key")
+                    .whenMatchedUpdateAll()
+                    .whenNotMatchedInsertAll()
+                    .execute()
+                )
+            self._pending = {}
+            self._evict(DeltaTable.forPath(self.spark, self.path))
+
+    def _evict(self, table) -> None:
+        """
+        Deletes the expired entries and the least recently stored ones beyond max_entries from the Delta table.
+        """
+        if self.ttl is not None:
+            table.delete(F.col("stored_at") < time.time() - self.ttl)
+        if self.max_entries is not None:
+            cutoff = (
+                table.toDF()
+                .select("stored_at")
+                .orderBy(F.col("stored_at").desc())
+                .limit(self.max_entries)
+                .agg(F.count("*").alias("entries"), F.min("stored_at").alias("cutoff"))
+                .first()
+            )
+            if cutoff["entries"] >= self.max_entries and cutoff["cutoff"] is not None:
+                table.delete(F.col("stored_at") < cutoff["cutoff"])
+
+
+class _TTLCache:
+    """
+    Small in-memory LRU of recent answers, entries expire ttl seconds after they were stored.
+    """
+
+    def __init__(self, max_entries: int, ttl: float | None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def _normalize_value(value) -> str:
+    """
+    Python twin of Client._normalize_text: upper-cases, drops dots, turns other punctuation into spaces
+    and collapses whitespace.
+    """
+    if value is None:
+        return ""
+    value = str(value).upper().replace(".", "")
+    return " ".join(re.sub(r"[\W_]+", " ", value).split())
+
+
+def _normalize_company(record) -> dict:
+    """
+    Normalizes the match fields of an input record the same way Client.normalize_input does.
+    """
+    name = _normalize_value(record.get("name")).split()
+    while name and name[-1] in LEGAL_FORM_SUFFIXES:
+        name.pop()
+    country = _normalize_value(record.get("country"))
+
+    return {
+        "name": " ".join(name),
+        "streetaddress": _normalize_value(record.get("streetaddress")),
+        "city": _normalize_value(record.get("city")),
+        "state": _normalize_value(record.get("state")),
+        "postal_code": _normalize_value(record.get("postal_code")).replace(" ", ""),
+        "country": COUNTRY_CODES.get(country, country),
+    }
+
+
+def _trigrams(value: str) -> set[str]:
+    padded = f"  {value} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def _numbers(value: str) -> set[str]:
+    return {token for token in value.split() if any(c.isdigit() for c in token)}
+
+
+def _jaccard(left: set, right: set) -> float:
+    if not left or not right:
+        return 0.0
+    return len(left & right) / len(left | right)
+
+
+class MatchIndex:
+    """
+    Local index of trusted cleanseMatch results, consulted by match_dnb before calling the API.
+    Entries are blocked on country plus postcode and on country plus the first name token, the candidates of
+    an input are scored on name trigrams, street tokens and postcode. Candidates in another city or state, or
+    agreeing on neither postcode nor city, are never used. An input whose best candidate reaches threshold is
+    answered with that candidate's stored response.
+    Only responses whose top candidate has a confidenceCode of at least trusted_confidence are indexed.
+    The index is a SQLite file read through mmap, safe to share between the worker threads of a client.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        threshold: float = 0.9,
+        trusted_confidence: int = 8,
+        max_candidates: int = 200,
+        mmap_size: int = 2**30,
+    ):
+        self.path = path
+        self.threshold = threshold
+        self.trusted_confidence = trusted_confidence
+        self.max_candidates = max_candidates
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS match_index_entries "
+            "(id INTEGER PRIMARY KEY, duns TEXT NOT NULL, name TEXT NOT NULL, streetaddress TEXT NOT NULL, "
+            "postal_code TEXT NOT NULL, country TEXT NOT NULL, response TEXT NOT NULL, stored_at REAL NOT NULL, "
+            "city TEXT NOT NULL DEFAULT '', state TEXT NOT NULL DEFAULT '', "
+            "UNIQUE (duns, name, streetaddress, city, state, postal_code, country))"
+        )
+        # Index files written before city and state were stored get them empty, so their entries only
+        # resolve inputs with the same postcode
+        columns = {
+            row[1]
+            for row in self._connection.execute(
+                "PRAGMA table_info(match_index_entries)"
+            )
+        }
+        for column in ("city", "state"):
+            if column not in columns:
+                self._connection.execute(
+                    f"ALTER TABLE match_index_entries ADD COLUMN {column} TEXT NOT NULL DEFAULT ''"
+                )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS match_index_blocks "
+            "(block TEXT NOT NULL, entry_id INTEGER NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS match_index_blocks_block ON match_index_blocks (block)"
+        )
+        self._connection.commit()
+
+    @staticmethod
+    def _blocks(company: dict) -> list[str]:
+        country = company["country"]
+        blocks = []
+        if company["postal_code"]:
+            blocks.append(f"{country}|P|{company['postal_code']}")
+        if company["name"]:
+            blocks.append(f"{country}|N|{company['name'].split()[0]}")
+        return blocks
+
+    @staticmethod
+    def similarity(company: dict, candidate: dict) -> float:
+        """
+        Weighted similarity of two normalized companies, fields missing on either side are left out.
+        Companies in different countries, cities or states, companies agreeing on neither postcode nor city,
+        or whose names carry different numbers, never match.
+        """
+        if company["country"] != candidate["country"]:
+            return 0.0
+        for field in ("city", "state"):
+            if (
+                company[field]
+                and candidate[field]
+                and company[field] != candidate[field]
+            ):
+                return 0.0
+        if not any(
+            company[field] and company[field] == candidate[field]
+            for field in ("postal_code", "city")
+        ):
+            return 0.0
+        if _numbers(company["name"]) != _numbers(candidate["name"]):
+            return 0.0
+
+        scores = [
+            (0.6, _jaccard(_trigrams(company["name"]), _trigrams(candidate["name"])))
+        ]
+        if company["streetaddress"] and candidate["streetaddress"]:
+            scores.append(
+                (
+                    0.25,
+                    _jaccard(
+                        set(company["streetaddress"].split()),
+                        set(candidate["streetaddress"].split()),
+                    ),
+                )
+            )
+        if company["postal_code"] and candidate["postal_code"]:
+            scores.append(
+                (0.15, float(company["postal_code"] == candidate["postal_code"]))
+            )
+
+        return sum(weight * score for weight, score in scores) / sum(
+            weight for weight, _ in scores
+        )
+
+    def lookup(self, record):
+        """
+        Returns the stored response of the most similar trusted entry, or None when no entry reaches the threshold.
+        """
+        company = _normalize_company(record)
+        blocks = self._blocks(company)
+        if not company["name"] or not blocks:
+            candidates = []
+        else:
+            with self._lock:
+                candidates = self._connection.execute(
+                    "SELECT DISTINCT e.name, e.streetaddress, e.city, e.state, e.postal_code, e.country, e.response "
+                    "FROM match_index_blocks b JOIN match_index_entries e ON e.id = b.entry_id "
+                    f"WHERE b.block IN ({', '.join('?' for _ in blocks)}) LIMIT ?",
+                    (*blocks, self.max_candidates),
+                ).fetchall()
+
+        best_score, best_response = 0.0, None
+        for (
+            name,
+            streetaddress,
+            city,
+            state,
+            postal_code,
+            country,
+            response,
+        ) in candidates:
+            score = self.similarity(
+                company,
+                {
+                    "name": name,
+                    "streetaddress": streetaddress,
+                    "city": city,
+                    "state": state,
+                    "postal_code": postal_code,
+                    "country": country,
+                },
+            )
+            if score > best_score:
+                best_score, best_response = score, response
+
+        with self._lock:
+            if best_score < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(best_response)
+
+    def add(self, record, response, commit: bool = True) -> bool:
+        """
+        Indexes the cleanseMatch response of an input record when its top candidate is trusted.
+        Returns whether the entry was added.
+        """
+        candidates = (response or {}).get("matchCandidates") or []
+        if not candidates:
+            return False
+        top = candidates[0]
+        confidence = top.get("matchQualityInformation", {}).get("confidenceCode", 0)
+        duns = top.get("organization", {}).get("duns")
+        company = _normalize_company(record)
+        blocks = self._blocks(company)
+        if confidence < self.trusted_confidence or not duns or not company["name"]:
+            return False
+
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT OR IGNORE INTO match_index_entries "
+                "(duns, name, streetaddress, city, state, postal_code, country, response, stored_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    duns,
+                    company["name"],
+                    company["streetaddress"],
+                    company["city"],
+                    company["state"],
+                    company["postal_code"],
+                    company["country"],
+                    json.dumps({**response, "matchCandidates": [top]}),
+                    time.time(),
+                ),
+            )
+            if not cursor.rowcount:
+                return False
+            self._connection.executemany(
+                "INSERT INTO match_index_blocks VALUES (?, ?)",
+                [(block, cursor.lastrowid) for block in blocks],
+            )
+            if commit:
+                self._connection.commit()
+        return True
+
+    def flush(self) -> None:
+        with self._lock:
+            self._connection.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "stale": 0}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM match_index_entries"
+            ).fetchone()[0]
+
+
+def _match_partition(
+    client_cls, config: dict, advanced: bool, minimum_confidence: int, field_names, rows
+):
+    """
+    Runs on the Spark executors. Builds a Spark-free client from the plain credentials in config
+    and matches the rows of one partition, yielding tuples in the Client.schema field order.
+    """
+    rows = list(rows)
+    if not rows:
+        return
+
+    client = client_cls(spark=None, **config)
+    today = date.today()
+    fn = lambda row: client._match_row(row, advanced, minimum_confidence, today)
+
+    for records in client._map_rows(fn, rows):
+        for record in records or []:
+            yield tuple(record.get(name) for name in field_names)
+
+
+def _rescore_partition(
+    client_cls, advanced: bool, minimum_confidence: int, field_names, rows
+):
+    """
+    Runs on the Spark executors. Rebuilds the match results of archived responses without any network I/O,
+    yielding tuples in the Client.schema field order.
+    """
+    client = client_cls(spark=None, key="", secret="")
+
+    for record in client._rescore_rows(rows, advanced, minimum_confidence):
+        yield tuple(record.get(name) for name in field_names)
+
+
+def _optional_str(value) -> str | None:
+    return None if value is None else str(value)
+
+
+def _row_dict(row) -> dict:
+    return row.asDict() if hasattr(row, "asDict") else dict(row)
+
+
+def _input_records(records) -> list:
+    """
+    Accepts a pandas DataFrame, a pyarrow Table or any iterable of mappings and returns a list of dicts.
+    """
+    if hasattr(records, "to_pylist"):
+        return records.to_pylist()
+    if hasattr(records, "to_dict"):
+        return records.to_dict("records")
+    return [_row_dict(record) for record in records]
+
+
+def _arrow_schema(fields):
+    import pyarrow as pa
+
+    types = {
+        "binary": pa.binary(),
+        "boolean": pa.bool_(),
+        "date": pa.date32(),
+        "double": pa.float64(),
+        "float": pa.float32(),
+        "int": pa.int32(),
+        "long": pa.int64(),
+        "string": pa.string(),
+        "timestamp": pa.timestamp("us", tz="UTC"),
+    }
+
+    def arrow_type(type_name):
+        if type_name.startswith("array<") and type_name.endswith(">"):
+            return pa.list_(arrow_type(type_name[6:-1]))
+        return types[type_name]
+
+    return pa.schema(
+        [
+            pa.field(name, arrow_type(type_name), *nullable)
+            for name, type_name, *nullable in fields
+        ]
+    )
+
+
+def _output_records(records: list[dict], fields, output: str):
+    """
+    Lays the result dictionaries out in the fields order as plain dicts, a pandas DataFrame or a pyarrow Table.
+    """
+    names = [field[0] for field in fields]
+    rows = [{name: record.get(name) for name in names} for record in records]
+
+    if output == "records":
+        return rows
+    if output == "pandas":
+        import pandas as pd
+
+        return pd.DataFrame.from_records(rows, columns=names)
+    if output == "arrow":
+        import pyarrow as pa
+
+        return pa.Table.from_pylist(rows, schema=_arrow_schema(fields))
+    raise ValueError(f"Unknown output {output!r}, use records, pandas or arrow.")
 
 
 @dataclass(frozen=True)
 class Client:
 
-    spark: SparkSession
-    key: str
-    secret: str
-    logger: logging.Logger = logging.getLogger("DNB Client")
-    minimum_confidence = 5
-    reg_id = ""
+    spark: "SparkSession | None"
+    key: str
+    secret: str
+    logger: logging.Logger = logging.getLogger("DNB Client")
+    max_workers: int = 1
+    tps: float | None = None
+    max_retries: int = 5
+    backoff_factor: float = 0.5
+    pool_maxsize: int = 10
+    timeout: float = 30
+    cache: MatchCache | None = None
+    data_blocks: tuple[str, ...] = ()
+    data_cache: MatchCache | None = None
+    metrics: MetricsHook = MetricsHook()
+    match_index: MatchIndex | None = None
+    lookup_cache_size: int = 1024
+    lookup_cache_ttl: float | None = 300
+    response_projection: bool = True
+    credentials: tuple[tuple[str, str], ...] = ()
+    minimum_confidence = 5
+    reg_id = ""
+
+    _api_auth_url: ClassVar[str] = "https://plus.dnb.com/v2/token"
+    _api_url: ClassVar[str] = "https://plus.dnb.com/v1"
+    _credentials: ClassVar[CredentialPool | None] = None
+    _session: ClassVar[requests.Session | None] = None
+    _async_session: ClassVar[object | None] = None
+    _async_slots: ClassVar[asyncio.Semaphore | None] = None
+    _lookup_cache: ClassVar[_TTLCache | None] = None
+    _inflight: ClassVar[dict | None] = None
+
+    def __post_init__(self):
+
+        # A single pooled session is shared by every endpoint so connections are kept alive
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=max(self.pool_maxsize, self.max_workers),
+            max_retries=0,
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers["Accept-Encoding"] = _ACCEPT_ENCODING
+        object.__setattr__(self, "_session", session)
+
+        # Every credential gets its own rate budget and session token, the token is fetched lazily
+        # on the first API call and refreshed before it expires
+        credentials = []
+        for key, secret in ((self.key, self.secret), *self.credentials):
+            credential = Credential(
+                key,
+                self.__define_auth_token(key, secret),
+                TokenBucket(self.tps) if self.tps is not None else None,
+            )
+            credential.token_provider = TokenProvider(
+                partial(self.__auth_proc, credential)
+            )
+            credentials.append(credential)
+        object.__setattr__(self, "_credentials", CredentialPool(credentials))
+
+        # Recent amatch answers and the lookups currently in flight, shared by all coroutines
+        object.__setattr__(
+            self,
+            "_lookup_cache",
+            _TTLCache(self.lookup_cache_size, self.lookup_cache_ttl),
+        )
+        object.__setattr__(self, "_inflight", {})
+
+    schema = _LazySchema(MATCH_FIELDS)
+
+    archive_schema = _LazySchema(ARCHIVE_FIELDS)
+
+    append_schema = _LazySchema(
+        [
+            ("update_date", "date"),
+            ("D-U-N-S_NUMBER", "string"),
+            ("block_ids", "array<string>"),
+            ("append_data", "string"),
+        ]
+    )
+
+    monitoring_schema = _LazySchema(
+        [
+            ("duns", "string"),
+            ("action", "string"),
+            ("status", "string"),
+            ("code", "string"),
+            ("message", "string"),
+        ]
+    )
+
+    subject_schema = _LazySchema(
+        [
+            ("duns", "string"),
+            ("subject", "string"),
+        ]
+    )
+
+    progress_schema = _LazySchema(
+        [
+            ("source_id", "long"),
+            ("completed_at", "timestamp"),
+        ]
+    )
+
+    notification_schema = _LazySchema(NOTIFICATION_FIELDS)
+
+    def __define_auth_token(self, key: str, secret: str):
+        """
+        This function will generate the authentication token for the API This is simple creating an base64 encoded string from the API key and secret
+        """
+        key_sec = f"{key}:{secret}"
+        encoded_creds = base64.b64encode(str(key_sec).encode("ascii")).decode(
+            "ascii"
+        )  # Base 64 activation
+
+        return encoded_creds
+
+    def __auth_proc(self, credential: Credential):
+        """
+        This function will create the session token for all api calls calls
+        """
+        payload = {"grant_type": "client_credentials"}
+        headers = {
+            "Authorization": f"Basic {credential.auth_token}",
+        }
+        start = time.perf_counter()
+        response = self._request(
+            "POST",
+            self._api_auth_url,
+            label="token",
+            authenticate=False,
+            credential=credential,
+            headers=headers,
+            json=payload,
+        )
+
+        try:
+            json_resp = _parse_response(response)
+        except ValueError:
+            json_resp = {}
+        success = response.status_code < 400 and "access_token" in json_resp
+        self.metrics.token_refresh(time.perf_counter() - start, success)
+        if response.status_code in _AUTH_REJECTED_STATUS_CODES:
+            self.logger.info(
+                "Authentication Error:\nWe could not authenticate to the D&B API. Please check your credentials."
+            )
+            raise DnbAuthError(
+                f"We could not authenticate to the D&B API ({response.status_code}). Please check your credentials."
+            )
+        if not success:
+            # Throttled or unavailable even after the retries, the credential itself was not rejected
+            raise DnbApiError.from_response(response)
+
+        self.logger.info("Succesfully authenticated to the D&B API.")
+        return json_resp
+
+    def _request(
+        self,
+        method: str,
+        url: str,
+        label: str = "other",
+        authenticate: bool = True,
+        credential: Credential | None = None,
+        **kwargs,
+    ):
+        """
+        Sends a request through the pooled session and the rate limiter of a credential.
+        label names the endpoint in the metrics events.
+        Throttled (429) and transient 5xx responses as well as connection errors are retried up to
+        max_retries times with exponential backoff, honouring the Retry-After header when present.
+        Throttled responses also slow the rate limiter down and take the credential out of rotation for the
+        cool-down, the retry goes to another credential of the pool when there is one.
+        With authenticate set the request is routed over the credential pool and the session token of the chosen
+        credential is added, a 401 refreshes it once and replays the request, a credential that is rejected again
+        is revoked. So is one whose token request is answered with 400, 401 or 403, while one whose token cannot be
+        fetched for another reason is benched like a throttled one and kept in rotation.
+        Without authenticate the request is sent with credential's rate budget.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        headers = kwargs.pop("headers", {})
+        replayed = set()
+        attempt = 0
+
+        while True:
+            if authenticate:
+                credential = self._credentials.checkout()
+            try:
+                if authenticate:
+                    try:
+                        token = credential.token_provider.token()
+                    except DnbAuthError:
+                        if not self._revoke_credential(credential):
+                            raise
+                        continue
+                    except DnbApiError:
+                        if attempt >= self.max_retries:
+                            raise
+                        self._bench_credential(credential, attempt)
+                        attempt += 1
+                        continue
+                    kwargs["headers"] = {**headers, "Authorization": f"Bearer {token}"}
+                else:
+                    kwargs["headers"] = headers
+
+                limiter = credential.rate_limiter if credential is not None else None
+                if limiter is not None:
+                    waited = limiter.acquire()
+                    if waited:
+                        self.metrics.throttle_wait(label, waited)
+
+                start = time.perf_counter()
+                try:
+                    response = self._session.request(method, url, **kwargs)
+                except (requests.ConnectionError, requests.Timeout) as error:
+                    self.metrics.request(
+                        label, method, None, time.perf_counter() - start, None
+                    )
+                    if attempt >= self.max_retries:
+                        raise
+                    self.metrics.retry(label, type(error).__name__, attempt + 1)
+                    self.logger.warning(
+                        f"Request to the D&B API failed ({error}), retrying (attempt {attempt + 1} of {self.max_retries})."
+                    )
+                    time.sleep(self._backoff_delay(attempt))
+                    attempt += 1
+                    continue
+
+                self.metrics.request(
+                    label,
+                    method,
+                    response.status_code,
+                    time.perf_counter() - start,
+                    _error_code(response),
+                )
+
+                if response.status_code == 401 and authenticate:
+                    if credential not in replayed:
+                        self.logger.info(
+                            "The D&B session token was rejected, refreshing it."
+                        )
+                        credential.token_provider.invalidate(token)
+                        replayed.add(credential)
+                        continue
+                    if self._revoke_credential(credential):
+                        continue
+
+                if response.status_code not in _RETRY_STATUS_CODES:
+                    if limiter is not None:
+                        limiter.success()
+                    return response
+
+                if attempt >= self.max_retries:
+                    return response
+
+                time.sleep(
+                    self._retry_delay(
+                        label, response, credential, attempt, routed=authenticate
+                    )
+                )
+                attempt += 1
+            finally:
+                if authenticate:
+                    self._credentials.release(credential)
+
+    def _revoke_credential(self, credential: Credential) -> bool:
+        """
+        Takes a credential whose token was rejected out of rotation, returns False when it is the last one left.
+        """
+        already_revoked = credential.revoked
+        revoked = self._credentials.revoke(credential)
+        if revoked and not already_revoked:
+            self.logger.warning(
+                f"The D&B API credential {credential.name} was rejected and is taken out of rotation."
+            )
+        return revoked
+
+    def _bench_credential(self, credential: Credential, attempt: int) -> None:
+        """
+        Takes a credential whose session token could not be fetched because of a transient error out of rotation
+        for the backoff of the attempt. It stays in the pool, unlike a revoked one.
+        """
+        self._credentials.throttled(credential, self.backoff_factor * 2**attempt)
+        self.logger.warning(
+            f"The D&B API credential {credential.name} could not fetch a session token, retrying "
+            f"(attempt {attempt + 1} of {self.max_retries})."
+        )
+
+    def _retry_delay(
+        self,
+        label: str,
+        response,
+        credential: Credential | None,
+        attempt: int,
+        routed: bool = True,
+    ) -> float:
+        """
+        Reports a retried response and returns how long to wait before the retry.
+        A throttled credential is slowed down, and when the request is routed over the pool it is benched instead
+        of waiting, so the retry can go to another credential right away.
+        """
+        retry_after = _retry_after(response)
+        self.metrics.retry(label, str(response.status_code), attempt + 1)
+        self.logger.warning(
+            f"The D&B API responded with {response.status_code}, retrying (attempt {attempt + 1} of {self.max_retries})."
+        )
+        delay = retry_after if retry_after is not None else self._backoff_delay(attempt)
+        if response.status_code == 429 and credential is not None:
+            if credential.rate_limiter is not None:
+                credential.rate_limiter.backoff(retry_after)
+            if routed:
+                self._credentials.throttled(credential, delay)
+                return 0.0
+        return delay
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """
+        Exponential backoff with full jitter for the given retry attempt.
+        """
+        return random.uniform(0, self.backoff_factor * 2**attempt)
+
+    def _async_client(self):
+        """
+        Returns the shared httpx.AsyncClient of the async methods, created on first use.
+        Requests beyond the pool size wait on a semaphore instead of queueing inside the pool,
+        whose bookkeeping slows down with the number of waiting requests.
+        """
+        if self._async_session is None:
+            import httpx
+
+            limit = max(self.pool_maxsize, self.max_workers)
+            object.__setattr__(self, "_async_slots", asyncio.Semaphore(limit))
+            object.__setattr__(
+                self,
+                "_async_session",
+                httpx.AsyncClient(
+                    timeout=self.timeout,
+                    headers={"Accept-Encoding": _ACCEPT_ENCODING},
+                    limits=httpx.Limits(
+                        max_connections=limit, max_keepalive_connections=limit
+                    ),
+                ),
+            )
+        return self._async_session
+
+    async def aclose(self) -> None:
+        """
+        Closes the async connection pool, amatch opens a new one when called again.
+        """
+        if self._async_session is not None:
+            await self._async_session.aclose()
+            object.__setattr__(self, "_async_session", None)
+
+    async def _arequest(self, method: str, url: str, label: str = "other", **kwargs):
+        """
+        Async counterpart of _request on the shared httpx connection pool, with the same credential routing,
+        rate limiters, retries, Retry-After handling, 401 replay and metrics. The session tokens are shared with
+        the sync methods, a refresh runs in a worker thread so the event loop is not blocked.
+        """
+        import httpx
+
+        client = self._async_client()
+        headers = kwargs.pop("headers", {})
+        replayed = set()
+        attempt = 0
+
+        while True:
+            credential = await self._credentials.acheckout()
+            try:
+                try:
+                    token = await asyncio.to_thread(credential.token_provider.token)
+                except DnbAuthError:
+                    if not self._revoke_credential(credential):
+                        raise
+                    continue
+                except DnbApiError:
+                    if attempt >= self.max_retries:
+                        raise
+                    self._bench_credential(credential, attempt)
+                    attempt += 1
+                    continue
+                kwargs["headers"] = {**headers, "Authorization": f"Bearer {token}"}
+
+                limiter = credential.rate_limiter
+                if limiter is not None:
+                    waited = await limiter.acquire_async()
+                    if waited:
+                        self.metrics.throttle_wait(label, waited)
+
+                start = time.perf_counter()
+                try:
+                    async with self._async_slots:
+                        response = await client.request(method, url, **kwargs)
+                except httpx.TransportError as error:
+                    self.metrics.request(
+                        label, method, None, time.perf_counter() - start, None
+                    )
+                    if attempt >= self.max_retries:
+                        raise
+                    self.metrics.retry(label, type(error).__name__, attempt + 1)
+                    self.logger.warning(
+                        f"Request to the D&B API failed ({error}), retrying (attempt {attempt + 1} of {self.max_retries})."
+                    )
+                    await asyncio.sleep(self._backoff_delay(attempt))
+                    attempt += 1
+                    continue
+
+                self.metrics.request(
+                    label,
+                    method,
+                    response.status_code,
+                    time.perf_counter() - start,
+                    _error_code(response),
+                )
+
+                if response.status_code == 401:
+                    if credential not in replayed:
+                        self.logger.info(
+                            "The D&B session token was rejected, refreshing it."
+                        )
+                        credential.token_provider.invalidate(token)
+                        replayed.add(credential)
+                        continue
+                    if self._revoke_credential(credential):
+                        continue
+
+                if response.status_code not in _RETRY_STATUS_CODES:
+                    if limiter is not None:
+                        limiter.success()
+                    return response
+
+                if attempt >= self.max_retries:
+                    return response
+
+                await asyncio.sleep(
+                    self._retry_delay(label, response, credential, attempt)
+                )
+                attempt += 1
+            finally:
+                self._credentials.release(credential)
+
+    def _map_rows(self, fn, rows, max_workers: int | None = None) -> list:
+        """
+        Applies fn to every row, concurrently when max_workers is greater than one.
+        The results are returned in input order. A row that fails is logged and returns None,
+        so one bad response does not throw away the rest of the batch.
+        """
+        if max_workers is None:
+            max_workers = self.max_workers
+
+        def guarded(row):
+            try:
+                return fn(row)
+            except DnbAuthError:
+                raise
+            except Exception as error:
+                self.logger.warning(f"Skipping input row {_row_id(row)}: {error}")
+                return None
+
+        if max_workers <= 1:
+            return [guarded(row) for row in rows]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(guarded, rows))
+
+    @staticmethod
+    def _match_params(record) -> dict:
+        """
+        Builds the cleanseMatch query params of an input record.
+        """
+        return {
+            "candidateMaximumQuantity": 1,
+            "name": record["name"],
+            "streetAddressLine1": record["streetaddress"],
+            "street&addressLocality": record["city"],
+            "addressRegion": record["state"],
+            "postalCode": record["postal_code"],
+            "countryISOAlpha2Code": record["country"],
+        }
+
+    def _response_projection(self):
+        """
+        Projection applied to cleanseMatch responses for in-memory use, see MATCH_RESPONSE_FIELDS.
+        The cache, the match index and the archive always keep the full documents.
+        """
+        return _MATCH_PROJECTION if self.response_projection else None
+
+    def _project_match(self, response: dict) -> dict:
+        projection = self._response_projection()
+        return projection(response) if projection is not None else response
+
+    def _known_match(self, record, cache_key: str) -> dict | None:
+        """
+        Returns the full cleanseMatch response of a record from the match cache or the match index, None when unknown.
+        """
+        if self.cache is not None:
+            cached = self.cache.lookup(cache_key)
+            if cached is not None:
+                return cached
+
+        if self.match_index is not None:
+            return self.match_index.lookup(record)
+        return None
+
+    def _store_match(
+        self,
+        record,
+        cache_key: str,
+        body: bytes,
+        full: dict | None = None,
+        commit: bool = False,
+    ) -> None:
+        """
+        Keeps a new cleanseMatch response body in the match cache and the match index.
+        full is the already parsed full document, if any.
+        """
+        if self.cache is not None:
+            self.cache.store_body(cache_key, body)
+        if self.match_index is not None:
+            self.match_index.add(
+                record, full if full is not None else _loads(body), commit=commit
+            )
+
+    def _match_dnb(
+        self, record, keep_body: bool = False, commit: bool = False
+    ) -> tuple[dict, bytes | None]:
+        """
+        Returns the cleanseMatch response of a record projected for in-memory use and, with keep_body set,
+        the unprojected JSON body for the archive. Match index additions are left to the caller's flush
+        unless commit is set.
+        """
+        params = self._match_params(record)
+        cache_key = _cache_key("cleanseMatch", params)
+        known = self._known_match(record, cache_key)
+        if known is not None:
+            body = json.dumps(known).encode("utf-8") if keep_body else None
+            return self._project_match(known), body
+
+        endpoint = f"{self._api_url}/match/cleanseMatch?"
+        url2 = endpoint + urllib.parse.urlencode(params)
+
+        response = self._request("GET", url2, label="cleanseMatch", data={})
+        if response.status_code >= 400:
+            raise DnbApiError.from_response(response)
+        json_resp = _parse_response(response, self._response_projection())
+        self._store_match(
+            record,
+            cache_key,
+            response.content,
+            None if self.response_projection else json_resp,
+            commit,
+        )
+
+        return json_resp, response.content if keep_body else None
+
+    def match_dnb(self, record):
+        """
+        This is the primary API call for each company in the input dataframe. This will package returns a JSON object with the match results
+        For complete Match API details, please refer to our documentation website, https://directplus.documentation.dnb.com/openAPI.html?apiID=IDRCleanseMatch
+        """
+        return self._match_dnb(record, commit=True)[0]
+
+    def _create_dataframe(self, data, schema):
+        """
+        Creates a dataframe from driver-side records or an RDD and reports the time spent in createDataFrame.
+        """
+        start = time.perf_counter()
+        dataframe = self.spark.createDataFrame(data, schema=schema)
+        self.metrics.timing("createDataFrame", time.perf_counter() - start)
+        return dataframe
+
+    def _log_cache_stats(
+        self,
+        before: dict | None,
+        cache: MatchCache | None,
+        label: str = "Match",
+        calls: str = "cleanseMatch",
+        flush: bool = True,
+    ) -> None:
+        """
+        Flushes cache, unless flush is unset, and reports its hit, miss and stale counts since the before snapshot,
+        a no-op without a cache.
+        """
+        if cache is None or before is None:
+            return
+
+        if flush:
+            cache.flush()
+        after = cache.stats()
+        hits, misses, stale = (
+            after[name] - before[name] for name in ("hits", "misses", "stale")
+        )
+        self.logger.info(
+            f"{label} cache: {hits} hits, {misses} misses, {stale} stale.\n"
+            f"{hits} billable {calls} calls were avoided."
+        )
+
+    def _distributed_match(
+        self,
+        input_df,
+        advanced: bool,
+        minimum_confidence: int,
+        max_workers: int | None = None,
+    ):
+        """
+        Runs the matching inside mapPartitions on the executors instead of collecting the input on the driver.
+        Only the credentials and settings are shipped to the executors, never the SparkSession bearing client.
+        The tps quota is split evenly across the partitions that can run at the same time.
+        """
+        num_partitions = input_df.rdd.getNumPartitions()
+        parallelism = max(
+            1, min(num_partitions, self.spark.sparkContext.defaultParallelism)
+        )
+        config = {
+            "key": self.key,
+            "secret": self.secret,
+            "credentials": self.credentials,
+            "max_workers": max_workers if max_workers is not None else self.max_workers,
+            "tps": self.tps / parallelism if self.tps is not None else None,
+            "max_retries": self.max_retries,
+            "backoff_factor": self.backoff_factor,
+            "pool_maxsize": self.pool_maxsize,
+            "timeout": self.timeout,
+            "response_projection": self.response_projection,
+        }
+        match_partition = partial(
+            _match_partition,
+            type(self),
+            config,
+            advanced,
+            minimum_confidence,
+            self.schema.fieldNames(),
+        )
 
-    _api_auth_url: ClassVar[str] = "https://plus.dnb.com/v2/token"
-    _api_url: ClassVar[str] = "https://plus.dnb.com/v1"
-    _auth_token: ClassVar[str] = ""
-    _session_token: ClassVar[str] = ""
+        return self._create_dataframe(
+            input_df.rdd.mapPartitions(match_partition), schema=self.schema
+        )
 
-    def __post_init__(self):
+    @staticmethod
+    def _normalize_text(column):
+        """
+        Spark expression that upper-cases a text column, drops dots, turns other punctuation into spaces
+        and collapses whitespace.
+        """
+        column = F.upper(F.coalesce(column.cast("string"), F.lit("")))
+        column = F.regexp_replace(column, r"\.", "")
+        column = F.regexp_replace(column, r"[^\p{L}\p{N}]+", " ")
+        return F.trim(column)
+
+    def normalize_input(self, input_df):
+        """
+        Adds normalized copies of the fields used by match_dnb (norm_name, norm_streetaddress, norm_city,
+        norm_postal_code, norm_country) and a match_key hash of them to the input dataframe.
+        Names lose their legal-form suffix and country names are mapped to ISO alpha-2 codes.
+        """
+        suffixes = "|".join(LEGAL_FORM_SUFFIXES)
+        country_codes = F.create_map(
+            *[F.lit(value) for item in COUNTRY_CODES.items() for value in item]
+        )
+        country = self._normalize_text(F.col("country"))
+
+        normalized_df = (
+            input_df.withColumn(
+                "norm_name",
+                F.regexp_replace(
+                    self._normalize_text(F.col("name")), rf"(\s({suffixes}))+$", ""
+                ),
+            )
+            .withColumn(
+                "norm_streetaddress", self._normalize_text(F.col("streetaddress"))
+            )
+            .withColumn("norm_city", self._normalize_text(F.col("city")))
+            .withColumn(
+                "norm_postal_code",
+                F.regexp_replace(self._normalize_text(F.col("postal_code")), " ", ""),
+            )
+            .withColumn("norm_country", F.coalesce(country_codes[country], country))
+        )
+
+        return normalized_df.withColumn(
+            "match_key",
+            F.sha2(
+                F.concat_ws(
+                    "|",
+                    "norm_name",
+                    "norm_streetaddress",
+                    "norm_city",
+                    "norm_postal_code",
+                    "norm_country",
+                ),
+                256,
+            ),
+        )
+
+    def _deduplicate_input(self, input_df):
+        """
+        Collapses input rows that normalize to the same company. Returns the distinct rows to match, one per
+        match_key carrying the lowest source_id and the normalized country code, and the mapping of every
+        original row to the source_id of its distinct row.
+        """
+        normalized_df = self.normalize_input(input_df)
+        first_in_key = Window.partitionBy("match_key").orderBy("source_id")
+
+        distinct_df = (
+            normalized_df.withColumn("_key_rank", F.row_number().over(first_in_key))
+            .filter(F.col("_key_rank") == 1)
+            .withColumn("country", F.col("norm_country"))
+            .select(*input_df.columns)
+        )
+        duplicates_df = normalized_df.withColumn(
+            "distinct_id", F.min("source_id").over(Window.partitionBy("match_key"))
+        ).select("distinct_id", "source_id", "name", "streetaddress", "city", "country")
+
+        return distinct_df, duplicates_df
+
+    def _expand_duplicates(self, matched_df, duplicates_df):
+        """
+        Joins the results matched for the distinct rows back to every original source_id.
+        """
+        input_columns = {
+            "input_id": "source_id",
+            "input_company_name": "name",
+            "input_streetaddress": "streetaddress",
+            "input_city": "city",
+            "input_country": "country",
+        }
+        expanded_df = matched_df.join(
+            duplicates_df, matched_df["input_id"] == duplicates_df["distinct_id"]
+        )
+
+        return expanded_df.select(
+            *[
+                (
+                    duplicates_df[input_columns[name]].alias(name)
+                    if name in input_columns
+                    else matched_df[name]
+                )
+                for name in self.schema.fieldNames()
+            ]
+        )
+
+    def match_and_cleanse(
+        self,
+        input_df,
+        minimum_confidence: int | None = None,
+        max_workers: int | None = None,
+        distributed: bool = False,
+        deduplicate: bool = False,
+        archive: str | None = None,
+        sink: str | None = None,
+        chunk_size: int = 1000,
+        sink_format: str = "parquet",
+    ):
+        """
+        This method updates two object properties with dataframes. The first is a list of all the records that have a match confidence score of defined by the user (default is 7) or higher. The second is a list of all the records that have a match confidence score lower than the user defined score.
+        With max_workers greater than one the cleanseMatch calls run concurrently under the client rate limiter, the output keeps the input order.
+        With distributed set the rows are matched on the executors and the input is never collected on the driver,
+        it cannot be combined with a match cache or match index.
+        With deduplicate set the input is normalized in Spark and the API is called once per distinct company,
+        the results are joined back to every original source_id.
+        With archive set to a path the raw cleanseMatch responses are appended there, see rescore.
+        With sink set to a path the results are flushed there every chunk_size records with a progress checkpoint,
+        a restarted run resumes after the source_ids already done.
+        """
+
+        if minimum_confidence is None:
+            minimum_confidence = self.minimum_confidence
+
+        # check input minimum confidence value
+        if minimum_confidence > 10:
+            raise Exception(
+                "The minimum confidence needs to be a number between 1 and 10"
+            )
+
+        if deduplicate:
+            distinct_df, duplicates_df = self._deduplicate_input(input_df)
+            matched_df = self.match_and_cleanse(
+                distinct_df,
+                minimum_confidence,
+                max_workers,
+                distributed,
+                archive=archive,
+                sink=sink,
+                chunk_size=chunk_size,
+                sink_format=sink_format,
+            )
+            return self._expand_duplicates(matched_df, duplicates_df)
+
+        if distributed:
+            self._check_driver_only(archive, sink)
+            return self._distributed_match(
+                input_df, False, minimum_confidence, max_workers
+            )
+
+        if sink is not None:
+            return self._chunked_match(
+                input_df,
+                False,
+                minimum_confidence,
+                max_workers,
+                archive,
+                sink,
+                chunk_size,
+                sink_format,
+            )
+
+        matched_records_list, failed_rows = self._match_and_archive(
+            input_df.collect(), False, minimum_confidence, max_workers, archive
+        )
+
+        self.logger.info(
+            f"All records have been processed.\nThe result set is {len(matched_records_list)} records."
+            f"\n{len(failed_rows)} input records failed and were skipped."
+        )
+
+        return self._create_dataframe(matched_records_list, self.schema)
+
+    def match_records(
+        self,
+        records,
+        minimum_confidence: int | None = None,
+        advanced: bool = True,
+        max_workers: int | None = None,
+        output: str = "records",
+        archive: list | None = None,
+    ):
+        """
+        Spark-free matching for services and small lookups, the client can be created with spark=None.
+        records is a pandas DataFrame, a pyarrow Table or an iterable of dicts with the match_and_cleanse input columns.
+        Returns the results in the Client.schema layout as a list of dicts, or as a pandas DataFrame or pyarrow Table
+        when output is "pandas" or "arrow". Failed records are logged and skipped.
+        With archive set to a list the raw cleanseMatch responses are appended to it in the ARCHIVE_FIELDS order,
+        see rescore_records.
+        """
+
+        if minimum_confidence is None:
+            minimum_confidence = self.minimum_confidence
+
+        # check input minimum confidence value
+        if minimum_confidence > 10:
+            raise Exception(
+                "The minimum confidence needs to be a number between 1 and 10"
+            )
+
+        matched_records_list, failed_rows = self._match_rows(
+            _input_records(records), advanced, minimum_confidence, max_workers, archive
+        )
+
+        self.logger.info(
+            f"All records have been processed.\nThe result set is {len(matched_records_list)} records."
+            f"\n{len(failed_rows)} input records failed and were skipped."
+        )
+
+        return _output_records(matched_records_list, MATCH_FIELDS, output)
+
+    async def amatch_dnb(self, record):
+        """
+        Async counterpart of match_dnb for online lookups. Recent answers are served from an in-memory LRU
+        (lookup_cache_size entries kept for lookup_cache_ttl seconds) and concurrent lookups of the same
+        company share one upstream request.
+        """
+        key = _cache_key("cleanseMatch", self._match_params(record))
+        cached = self._lookup_cache.get(key)
+        if cached is not None:
+            return cached
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._amatch_upstream(record, key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # A cancelled caller must not cancel the lookup shared with the other callers
+        return await asyncio.shield(task)
+
+    async def _amatch_upstream(self, record, key: str):
+        # The match cache and the match index do blocking SQLite I/O, keep it off the event loop
+        response = await asyncio.to_thread(self._known_match, record, key)
+        if response is not None:
+            response = self._project_match(response)
+        else:
+            url = f"{self._api_url}/match/cleanseMatch?" + urllib.parse.urlencode(
+                self._match_params(record)
+            )
+            http_response = await self._arequest("GET", url, label="cleanseMatch")
+            if http_response.status_code >= 400:
+                raise DnbApiError.from_response(http_response)
+            response = _parse_response(http_response, self._response_projection())
+            await asyncio.to_thread(
+                self._store_match,
+                record,
+                key,
+                http_response.content,
+                None if self.response_projection else response,
+                commit=True,
+            )
+
+        self._lookup_cache.put(key, response)
+        return response
+
+    async def amatch(
+        self,
+        record,
+        minimum_confidence: int | None = None,
+        advanced: bool = True,
+    ) -> list[dict]:
+        """
+        Matches a single input record without blocking the event loop and returns its result dictionaries
+        in the Client.schema layout, see amatch_dnb.
+        """
+        if minimum_confidence is None:
+            minimum_confidence = self.minimum_confidence
+
+        # check input minimum confidence value
+        if minimum_confidence > 10:
+            raise Exception(
+                "The minimum confidence needs to be a number between 1 and 10"
+            )
+
+        record = _row_dict(record)
+        results = await self.amatch_dnb(record)
+        return _output_records(
+            self._build_match_records(
+                record, results, advanced, minimum_confidence, date.today()
+            ),
+            MATCH_FIELDS,
+            "records",
+        )
+
+    def _match_rows(
+        self,
+        rows,
+        advanced: bool,
+        minimum_confidence: int,
+        max_workers: int | None = None,
+        archive_entries: list | None = None,
+        flush: bool = True,
+    ) -> tuple[list[dict], list]:
+        """
+        Matches the rows on the driver and returns the result dictionaries and the failed rows.
+        Reports the match cache statistics and appends the raw responses to archive_entries when given,
+        as tuples in the ARCHIVE_FIELDS order. Without flush the new cache entries are left for the caller to flush.
+        """
+        cache_stats = self.cache.stats() if self.cache is not None else None
+        index_stats = self.match_index.stats() if self.match_index is not None else None
+        today = date.today()
+        if self.cache is not None:
+            self.cache.prefetch(
+                [_cache_key("cleanseMatch", self._match_params(row)) for row in rows]
+            )
+
+        results = self._map_rows(
+            lambda row: self._match_row(
+                row, advanced, minimum_confidence, today, archive_entries
+            ),
+            rows,
+            max_workers,
+        )
+        matched_records_list = [
+            matched_cos for records in results if records for matched_cos in records
+        ]
+
+        self._log_cache_stats(cache_stats, self.cache, flush=flush)
+        if self.match_index is not None:
+            self._log_cache_stats(index_stats, self.match_index, "Match index")
+
+        failed_rows = [row for row, records in zip(rows, results) if records is None]
+
+        return matched_records_list, failed_rows
+
+    def _match_and_archive(
+        self,
+        rows,
+        advanced: bool,
+        minimum_confidence: int,
+        max_workers: int | None,
+        archive: str | None,
+        flush: bool = True,
+    ) -> tuple[list[dict], list]:
+        """
+        _match_rows for the Spark methods, the raw responses are appended to the archive path when given.
+        """
+        archive_entries = [] if archive is not None else None
+        matched_records_list, failed_rows = self._match_rows(
+            rows, advanced, minimum_confidence, max_workers, archive_entries, flush
+        )
+        if archive_entries:
+            self._create_dataframe(
+                archive_entries, schema=self.archive_schema
+            ).write.mode("append").parquet(archive)
+
+        return matched_records_list, failed_rows
+
+    def _check_driver_only(self, archive: str | None, sink: str | None) -> None:
+        if archive is not None or sink is not None:
+            raise ValueError(
+                "Archiving raw responses and chunked sinks are only supported when matching on the driver."
+            )
+        # The executors would call the API for every row, bypassing the configured cache and index
+        if self.cache is not None or self.match_index is not None:
+            raise ValueError(
+                "The match cache and the match index are only supported when matching on the driver."
+            )
 
-        _auth_token = self.__define_auth_token()
+    def _chunked_match(
+        self,
+        input_df,
+        advanced: bool,
+        minimum_confidence: int,
+        max_workers: int | None,
+        archive: str | None,
+        sink: str,
+        chunk_size: int,
+        sink_format: str,
+    ):
+        """
+        Streams the input to the driver one partition at a time and matches it in chunks of chunk_size rows.
+        Every chunk is appended to the sink before its source_ids are recorded in the <sink>/_progress checkpoint,
+        a restarted run skips the source_ids found in either. Peak driver memory stays bounded by one
+        partition and one chunk whatever the size of the input. Returns the sink as a dataframe.
+        """
+        if chunk_size < 1:
+            raise ValueError("The chunk size needs to be a positive number of records.")
+
+        progress = f"{sink.rstrip('/')}/_progress"
+        done_ids = None
+        for path, column, fmt in (
+            (progress, "source_id", "parquet"),
+            (sink, "input_id", sink_format),
+        ):
+            try:
+                ids = (
+                    self.spark.read.format(fmt)
+                    .load(path)
+                    .select(F.col(column).alias("source_id"))
+                )
+            except Exception:
+                # Nothing has been written there yet
+                continue
+            done_ids = ids if done_ids is None else done_ids.union(ids)
 
+        if done_ids is not None:
+            input_df = input_df.join(done_ids.distinct(), "source_id", "left_anti")
+
+        rows = input_df.toLocalIterator()
+        processed_count = 0
+        failed_count = 0
         try:
-            _session_token = self.__auth_proc()["access_token"]
-            self.logger.info("Succesfully authenticated to the D&B API.")
-        except Exception as error:
-            self.logger.info(
-                "Authentication Error:\nWe could not authenticate to the D&B API. Please check your credentials."
+            while chunk := list(itertools.islice(rows, chunk_size)):
+                matched_records_list, failed_rows = self._match_and_archive(
+                    chunk,
+                    advanced,
+                    minimum_confidence,
+                    max_workers,
+                    archive,
+                    flush=False,
+                )
+                if matched_records_list:
+                    self._create_dataframe(
+                        matched_records_list, self.schema
+                    ).write.format(sink_format).mode("append").save(sink)
+
+                failed_ids = {row["source_id"] for row in failed_rows}
+                completed_at = datetime.now(timezone.utc)
+                completed = [
+                    (row["source_id"], completed_at)
+                    for row in chunk
+                    if row["source_id"] not in failed_ids
+                ]
+                if completed:
+                    self._create_dataframe(
+                        completed, schema=self.progress_schema
+                    ).write.mode("append").parquet(progress)
+
+                processed_count += len(chunk)
+                failed_count += len(failed_rows)
+                self.logger.info(
+                    f"Checkpointed {processed_count} records, {failed_count} failed and will be retried on the next run."
+                )
+        finally:
+            # Once per run rather than per chunk, and also when a chunk failed as its calls were billed
+            if self.cache is not None:
+                self.cache.flush()
+
+        return self.spark.read.format(sink_format).load(sink)
+
+    @staticmethod
+    def _input_hash(*columns):
+        """
+        Spark expression hashing the given input columns, used to detect changed source rows.
+        """
+        return F.sha2(
+            F.concat_ws(
+                "\u001f",
+                *[
+                    F.coalesce(F.col(column).cast("string"), F.lit(""))
+                    for column in columns
+                ],
+            ),
+            256,
+        )
+
+    def match_incremental(
+        self,
+        input_df,
+        output: str,
+        advanced: bool = True,
+        minimum_confidence: int | None = None,
+        max_workers: int | None = None,
+        delete_missing: bool = True,
+    ):
+        """
+        Incremental re-match into the Delta table of match results at output. The match fields of every source_id are
+        hashed and compared with the hashes recorded by the previous run in <output>/_input_hashes, only new and changed
+        rows are sent to the API. Their results replace the previous ones in a single Delta merge, rows of unchanged
+        source_ids are kept as they are, and with delete_missing the results of source_ids no longer in the input are removed.
+        Tables not written by match_incremental yet are compared on the input_* columns they hold.
+        Rows that fail keep their previous results and are retried on the next run. Returns the output table.
+        """
+        from delta.tables import DeltaTable
+
+        if minimum_confidence is None:
+            minimum_confidence = self.minimum_confidence
+
+        # check input minimum confidence value
+        if minimum_confidence > 10:
+            raise Exception(
+                "The minimum confidence needs to be a number between 1 and 10"
             )
 
-        object.__setattr__(self, "_auth_token", _auth_token)
-        object.__setattr__(self, "_session_token", _session_token)
+        hashes_path = f"{output.rstrip('/')}/_input_hashes"
+        current_hashes = input_df.select(
+            "source_id",
+            self._input_hash(
+                "name", "streetaddress", "city", "state", "postal_code", "country"
+            ).alias("input_hash"),
+        )
+
+        try:
+            previous_df = self.spark.read.format("delta").load(output)
+        except Exception:
+            # Nothing has been written there yet
+            previous_df = None
 
-    schema = StructType(
-        [
-            StructField("update_date", DateType(), True),
-            StructField("accepted", BooleanType(), True),
-            StructField("input_id", LongType(), True),
-            StructField("input_company_name", StringType(), True),
-            StructField("input_streetaddress", StringType(), True),
-            StructField("input_city", StringType(), True),
-            StructField("input_country", StringType(), True),
-            StructField("dnb_duns", StringType(), True),
-            StructField("dnb_name", StringType(), True),
-            StructField("dnb_nameMatchScore", DoubleType(), True),
-            StructField("dnb_status", StringType(), True),
-            StructField("dnb_streetaddress", StringType(), True),
-            StructField("dnb_city", StringType(), True),
-            StructField("dnb_country", StringType(), True),
-            StructField("dnb_confidenceCode", LongType(), True),
-            StructField("MG_Name", StringType(), True),
-            StructField("MG_StreetNumber", StringType(), True),
-            StructField("MG_StreetName", StringType(), True),
-            StructField("MG_City", StringType(), True),
-            StructField("MG_State", StringType(), True),
-            StructField("MG_PObox", StringType(), True),
-            StructField("MG_Phone", StringType(), True),
-            StructField("MG_PostCode", StringType(), True),
-            StructField("MG_Density", StringType(), True),
-            StructField("MG_Uniqueness", StringType(), True),
-            StructField("MG_SIC", StringType(), True),
-            StructField("MDP_Name", StringType(), True),
-            StructField("MDP_StreetNumber", StringType(), True),
-            StructField("MDP_StreetName", StringType(), True),
-            StructField("MDP_City", StringType(), True),
-            StructField("MDP_State", StringType(), True),
-            StructField("MDP_PObox", StringType(), True),
-            StructField("MDP_Phone", StringType(), True),
-            StructField("MDP_PostCode", StringType(), True),
-            StructField("MDP_DUNS", StringType(), True),
-            StructField("MDP_SIC", StringType(), True),
-            StructField("MDP_Density", StringType(), True),
-            StructField("MDP_Uniqueness", StringType(), True),
-            StructField("MDP_NationalID", StringType(), True),
-            StructField("MDP_URL", StringType(), True),
-            StructField("nameMatchScore", DoubleType(), True),
-            StructField("matchGradeComponentsCount", IntegerType(), True),
-            StructField("confidenceCode", IntegerType(), True),
-            StructField("isPrimary", BooleanType(), True),
-            StructField("phoneMatch", BooleanType(), True),
-            StructField("isExec", BooleanType(), True),
-            StructField("urlMatch", BooleanType(), True),
-            StructField("exactName", BooleanType(), True),
-            StructField("strongName", BooleanType(), True),
-            StructField("closeName", BooleanType(), True),
-            StructField("regNoMatch", BooleanType(), True),
-            StructField("isRegistered", BooleanType(), True),
-            StructField("postCodeMatch", BooleanType(), True),
-            StructField("addressMatchStrong", BooleanType(), True),
-            StructField("addressMatchLoose", BooleanType(), True),
-            StructField(
-                "customMatchGrade", StringType(), True
-            ),  # [Todo]change name to match summary
+        previous_hashes = None
+        if previous_df is not None:
+            try:
+                previous_hashes = self.spark.read.parquet(hashes_path)
+                comparable_hashes = current_hashes
+            except Exception:
+                previous_hashes = previous_df.select(
+                    F.col("input_id").alias("source_id"),
+                    self._input_hash(
+                        "input_company_name",
+                        "input_streetaddress",
+                        "input_city",
+                        "input_country",
+                    ).alias("input_hash"),
+                ).distinct()
+                comparable_hashes = input_df.select(
+                    "source_id",
+                    self._input_hash("name", "streetaddress", "city", "country").alias(
+                        "input_hash"
+                    ),
+                )
+
+        if previous_hashes is None:
+            changes_df = current_hashes.select(
+                "source_id", F.lit("new").alias("change")
+            )
+        else:
+            changes_df = (
+                comparable_hashes.alias("current")
+                .join(previous_hashes.alias("previous"), "source_id", "full_outer")
+                .select(
+                    "source_id",
+                    F.when(F.col("previous.input_hash").isNull(), "new")
+                    .when(F.col("current.input_hash").isNull(), "deleted")
+                    .when(
+                        F.col("current.input_hash") != F.col("previous.input_hash"),
+                        "changed",
+                    )
+                    .otherwise("unchanged")
+                    .alias("change"),
+                )
+            )
+        changes_df = changes_df.cache()
+        counts = {
+            row["change"]: row["count"]
+            for row in changes_df.groupBy("change").count().collect()
+        }
+        self.logger.info(
+            f"{counts.get('new', 0)} new, {counts.get('changed', 0)} changed, {counts.get('deleted', 0)} deleted "
+            f"and {counts.get('unchanged', 0)} unchanged source rows."
+        )
+
+        rows = input_df.join(
+            changes_df.filter(F.col("change").isin("new", "changed")),
+            "source_id",
+            "left_semi",
+        ).collect()
+        matched_records_list, failed_rows = self._match_rows(
+            rows, advanced, minimum_confidence, max_workers
+        )
+        failed_ids = {row["source_id"] for row in failed_rows}
+        matched_ids = [
+            (row["source_id"],) for row in rows if row["source_id"] not in failed_ids
         ]
-    )
 
-    def __define_auth_token(self):
+        replaced_df = self._create_dataframe(
+            matched_ids, schema=input_df.select("source_id").schema
+        )
+        if delete_missing:
+            replaced_df = replaced_df.union(
+                changes_df.filter(F.col("change") == "deleted").select("source_id")
+            )
+
+        records_df = self._create_dataframe(matched_records_list, self.schema)
+        if previous_df is None:
+            records_df.write.format("delta").mode("append").save(output)
+        else:
+            # One merge, so one Delta commit: the previous rows of the replaced source_ids match their tombstone
+            # and are deleted, the new result rows carry no merge key and are inserted.
+            key_type = replaced_df.schema["source_id"].dataType
+            staged_df = records_df.withColumn(
+                "_merge_key", F.lit(None).cast(key_type)
+            ).unionByName(
+                replaced_df.distinct().select(
+                    *[
+                        F.lit(None).cast(field.dataType).alias(field.name)
+                        for field in self.schema.fields
+                    ],
+                    F.col("source_id").alias("_merge_key"),
+                )
+            )
+            (
+                DeltaTable.forPath(self.spark, output)
+                .alias("target")
+                .merge(staged_df.alias("staged"), "target.input_id = staged._merge_key")
+                .whenMatchedDelete()
+                .whenNotMatchedInsert(
+                    condition="staged._merge_key IS NULL",
+                    values={
+                        field.name: f"staged.`{field.name}`"
+                        for field in self.schema.fields
+                    },
+                )
+                .execute()
+            )
+
+        # Failed rows keep their previous hash to be retried next run, collected first as the path is overwritten
+        recorded_hashes = current_hashes.filter(
+            ~F.col("source_id").isin(list(failed_ids))
+        )
+        if failed_ids and previous_hashes is not None:
+            recorded_hashes = recorded_hashes.union(
+                self._create_dataframe(
+                    previous_hashes.filter(
+                        F.col("source_id").isin(list(failed_ids))
+                    ).collect(),
+                    schema=current_hashes.schema,
+                )
+            )
+        recorded_hashes.write.mode("overwrite").parquet(hashes_path)
+        changes_df.unpersist()
+
+        self.logger.info(
+            f"{len(matched_ids)} source rows were matched again and merged into {output}, "
+            f"{len(failed_ids)} failed and will be retried on the next run."
+        )
+
+        return self.spark.read.format("delta").load(output)
+
+    def _match_row(
+        self,
+        row,
+        advanced: bool,
+        minimum_confidence: int,
+        today: date,
+        archive_entries: list | None = None,
+    ) -> list[dict]:
         """
-        This function will generate the authentication token for the API This is simple creating an base64 encoded string from the API key and secret
+        Matches a single input row and returns its result dictionaries.
+        The raw, unprojected response body is added to archive_entries when given.
         """
-        key_sec = f"{self.key}:{self.secret}"
-        encoded_creds = base64.b64encode(str(key_sec).encode("ascii")).decode(
-            "ascii"
-        )  # Base 64 activation
+        results, body = self._match_dnb(row, keep_body=archive_entries is not None)
+        if archive_entries is not None:
+            archive_entries.append(
+                (
+                    row["source_id"],
+                    _cache_key("cleanseMatch", self._match_params(row)),
+                    json.dumps(_row_dict(row), default=str),
+                    zlib.compress(body),
+                    datetime.now(timezone.utc),
+                )
+            )
 
-        return encoded_creds
+        return self._build_match_records(
+            row, results, advanced, minimum_confidence, today
+        )
 
-    def __auth_proc(self):
+    def _build_match_records(
+        self, row, results, advanced: bool, minimum_confidence: int, today: date
+    ) -> list[dict]:
+        if advanced:
+            return self._adv_match_records(row, results, minimum_confidence, today)
+        return self._basic_match_records(row, results, minimum_confidence, today)
+
+    def _basic_match_records(
+        self, row, results, minimum_confidence: int, today: date
+    ) -> list[dict]:
         """
-        This function will create the session token for all api calls calls
+        Returns the result dictionaries used by match_and_cleanse for a single input row.
         """
-        payload = {"grant_type": "client_credentials"}
-        headers = {
-            "Authorization": f"Basic {self._auth_token}",
+        matched_records_list = []
+        for match in results.get("matchCandidates", []):
+            t = match["organization"]
+            # set the accepted value
+            if match["matchQualityInformation"]["confidenceCode"] >= minimum_confidence:
+                accepted = True
+            else:
+                accepted = False
+            # create the dictionary of results
+            matched_cos = {
+                "update_date": today,
+                "input_id": row["source_id"],
+                "input_company_name": row["name"],
+                "input_streetaddress": row["streetaddress"],
+                "input_city": row["city"],
+                "input_country": row["country"],
+                "dnb_duns": t["duns"],
+                "dnb_name": t["primaryName"],
+                "dnb_streetaddress": t["primaryAddress"]["streetAddress"].get(
+                    "line1", None
+                ),
+                "dnb_city": t["primaryAddress"]["addressLocality"].get("name", None),
+                "dnb_country": t["primaryAddress"]["addressCountry"].get(
+                    "isoAlpha2Code", None
+                ),
+                "dnb_status": t["dunsControlStatus"]["operatingStatus"]["description"],
+                "dnb_confidenceCode": match["matchQualityInformation"][
+                    "confidenceCode"
+                ],
+                "accepted": accepted,
+                "dnb_nameMatchScore": match["matchQualityInformation"][
+                    "nameMatchScore"
+                ],
+                "dnb_matchgradeComponents": match["matchQualityInformation"][
+                    "matchGradeComponents"
+                ],
+                "dnb_matchDataProfileComponents": match["matchQualityInformation"][
+                    "matchDataProfileComponents"
+                ],
+            }
+            matched_records_list.append(matched_cos)
+
+        return matched_records_list
+
+    def _subjects_page(self, reg_id: str, page_number: int, page_size: int) -> list:
+        endpoint = f"{self._api_url}/monitoring/registrations/{reg_id}/subjects"
+        response = self._request(
+            "GET",
+            endpoint,
+            label="monitoring.subjects",
+            params={"pageNumber": page_number, "pageSize": page_size},
+        )
+        if response.status_code >= 400:
+            raise DnbApiError.from_response(response)
+
+        return _parse_response(response).get("subjects", [])
+
+    def iter_monitoring_subject_pages(self, reg_id: str, page_size: int = 1000):
+        """
+        Generator over the pages of subjects in a monitoring registration. The next page is fetched in the
+        background while the current one is being consumed, only two pages are held in memory at a time.
+        """
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            page_number = 1
+            next_page = executor.submit(
+                self._subjects_page, reg_id, page_number, page_size
+            )
+            while True:
+                subjects = next_page.result()
+                if len(subjects) < page_size:
+                    if subjects:
+                        yield subjects
+                    return
+                page_number += 1
+                next_page = executor.submit(
+                    self._subjects_page, reg_id, page_number, page_size
+                )
+                yield subjects
+
+    def export_monitoring_registrations(
+        self,
+        reg_id: str,
+        path: str | None = None,
+        format: str = "parquet",
+        page_size: int = 1000,
+        rows_per_write: int = 100_000,
+    ):
+        """
+        This method will export the subjects of a monitoring registration. The reg_id is the unique identifier for the monitoring endpoint
+        Returns a dataframe with the subject_schema. With path set the pages are streamed to that location every rows_per_write
+        subjects, so memory use stays constant whatever the size of the registration, and the written data is returned.
+        """
+
+        def subject_rows(subjects):
+            return [
+                (
+                    subject.get("duns") if isinstance(subject, dict) else subject,
+                    json.dumps(subject),
+                )
+                for subject in subjects
+            ]
+
+        pages = self.iter_monitoring_subject_pages(reg_id, page_size)
+
+        if path is None:
+            rows = [row for subjects in pages for row in subject_rows(subjects)]
+            self.logger.info(f"Exported {len(rows)} subjects of registration {reg_id}.")
+            return self._create_dataframe(rows, schema=self.subject_schema)
+
+        exported_count = 0
+        buffered_rows = []
+        mode = "overwrite"
+        for subjects in itertools.chain(pages, [None]):
+            if subjects is not None:
+                buffered_rows.extend(subject_rows(subjects))
+            # The last write also creates an empty export for an empty registration
+            if len(buffered_rows) >= rows_per_write or (
+                subjects is None and (buffered_rows or mode == "overwrite")
+            ):
+                self._create_dataframe(
+                    buffered_rows, schema=self.subject_schema
+                ).write.format(format).mode(mode).save(path)
+                exported_count += len(buffered_rows)
+                buffered_rows = []
+                mode = "append"
+
+        self.logger.info(
+            f"Exported {exported_count} subjects of registration {reg_id} to {path}."
+        )
+
+        return self.spark.read.format(format).load(path)
+
+    def _pull_notifications(
+        self, reg_id: str, max_notifications: int
+    ) -> tuple[str | None, list]:
+        """
+        Pulls the next batch of notifications of a registration, returns its transaction ID and the notifications.
+        A pulled batch is not delivered to other consumers and is removed once acknowledged.
+        """
+        endpoint = f"{self._api_url}/monitoring/registrations/{reg_id}/notifications"
+        response = self._request(
+            "GET",
+            endpoint,
+            label="monitoring.notifications",
+            params={"maxNotifications": max_notifications},
+        )
+        if response.status_code >= 400:
+            raise DnbApiError.from_response(response)
+
+        json_resp = _parse_response(response)
+        return (
+            json_resp.get("transactionDetail", {}).get("transactionID"),
+            json_resp.get("notifications", []),
+        )
+
+    def _ack_notifications(self, reg_id: str, transaction_id: str) -> None:
+        endpoint = f"{self._api_url}/monitoring/registrations/{reg_id}/notifications/{transaction_id}"
+        response = self._request("DELETE", endpoint, label="monitoring.ack")
+        if response.status_code >= 400:
+            raise DnbApiError.from_response(response)
+
+    def iter_monitoring_notifications(
+        self, reg_id: str, max_notifications: int = 100, concurrency: int = 4
+    ):
+        """
+        Generator over rounds of pulled notification batches, each round is a list of (transaction_id, notifications)
+        pulled concurrently by up to concurrency consumers. Stops once the registration has no pending notifications.
+        The caller acknowledges the batches of a round with _ack_notifications once they are applied.
+        """
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            while True:
+                batches = [
+                    batch
+                    for batch in executor.map(
+                        lambda _: self._pull_notifications(reg_id, max_notifications),
+                        range(concurrency),
+                    )
+                    if batch[1]
+                ]
+                if not batches:
+                    return
+                yield batches
+                if any(
+                    len(notifications) < max_notifications
+                    for _, notifications in batches
+                ):
+                    return
+
+    @staticmethod
+    def _notification_updates(notifications: list) -> dict:
+        """
+        Folds the UPDATE notifications into the latest value of every mapped element per DUNS,
+        see MATCH_NOTIFICATION_ELEMENTS.
+        """
+        latest = {}
+        for notification in notifications:
+            if notification.get("type") != "UPDATE":
+                continue
+            duns = notification.get("organization", {}).get("duns")
+            for element in notification.get("elements", []):
+                column = MATCH_NOTIFICATION_ELEMENTS.get(element.get("element"))
+                if duns is None or column is None:
+                    continue
+                timestamp = element.get("timestamp") or ""
+                current = latest.setdefault(duns, {}).get(column)
+                if current is None or timestamp >= current[0]:
+                    latest[duns][column] = (timestamp, element.get("current"))
+
+        return {
+            duns: {column: value for column, (_, value) in columns.items()}
+            for duns, columns in latest.items()
         }
-        response = requests.request(
-            "POST", self._api_auth_url, headers=headers, json=payload
+
+    def _merge_match_updates(self, match_path: str, updates: dict) -> None:
+        """
+        Applies the folded element updates to every match result of the changed DUNS with a Delta merge.
+        """
+        from delta.tables import DeltaTable
+
+        columns = list(MATCH_NOTIFICATION_ELEMENTS.values())
+        updates_df = self._create_dataframe(
+            [
+                (duns, *(values.get(column) for column in columns))
+                for duns, values in updates.items()
+            ],
+            schema=", ".join(f"{name} string" for name in ["dnb_duns", *columns]),
+        )
+        (
+            DeltaTable.forPath(self.spark, match_path)
+            .alias("target")
+            .merge(updates_df.alias("updates"), "target.dnb_duns = updates.dnb_duns")
+            .whenMatchedUpdate(
+                set={
+                    "update_date": F.current_date(),
+                    **{
+                        column: F.coalesce(
+                            F.col(f"updates.{column}"), F.col(f"target.{column}")
+                        )
+                        for column in columns
+                    },
+                }
+            )
+            .execute()
+        )
+
+    def _merge_data_blocks(
+        self, data_path: str, duns_list: list[str], blocks: list[str], max_workers
+    ) -> int:
+        """
+        Downloads the Data Blocks of the changed DUNS again and upserts them into the Data Blocks table with a Delta merge.
+        Returns the number of DUNS refreshed.
+        """
+        from delta.tables import DeltaTable
+
+        today = date.today()
+        results = self._map_rows(
+            lambda duns: self._fetch_data_blocks(duns, blocks, refresh=True),
+            duns_list,
+            max_workers,
         )
+        records = [
+            {
+                "update_date": today,
+                "D-U-N-S_NUMBER": duns,
+                "block_ids": blocks,
+                "append_data": json.dumps(json_resp),
+            }
+            for duns, json_resp in zip(duns_list, results)
+            if json_resp is not None
+        ]
+        if self.data_cache is not None:
+            self.data_cache.flush()
+        if not records:
+            return 0
 
-        return response.json()
+        (
+            DeltaTable.forPath(self.spark, data_path)
+            .alias("target")
+            .merge(
+                self._create_dataframe(records, self.append_schema).alias("updates"),
+                "target.`D-U-N-S_NUMBER` = updates.`D-U-N-S_NUMBER`",
+            )
+            .whenMatchedUpdateAll()
+            .whenNotMatchedInsertAll()
+            .execute()
+        )
+        return len(records)
 
-    def match_dnb(self, record):
+    def apply_monitoring_notifications(
+        self,
+        reg_id: str,
+        data_path: str | None = None,
+        match_path: str | None = None,
+        blocks: list[str] | None = None,
+        max_notifications: int = 100,
+        concurrency: int = 4,
+        max_workers: int | None = None,
+    ):
         """
-        This is the primary API call for each company in the input dataframe. This will package returns a JSON object with the match results
-        For complete Match API details, please refer to our documentation website, https://directplus.documentation.dnb.com/openAPI.html?apiID=IDRCleanseMatch
+        Consumes the pending monitoring notifications of a registration and applies them to the stored tables,
+        so a refresh costs one call per changed company instead of a new append_data over the whole portfolio.
+        With match_path set the changed elements listed in MATCH_NOTIFICATION_ELEMENTS are merged into that Delta table
+        of match results. With data_path set the Data Blocks (blocks, by default data_blocks) of every updated DUNS are
+        downloaded again and merged into that Delta table of append_data results.
+        Batches are pulled concurrently and acknowledged only after they were applied, an interrupted run redelivers them.
+        A round in which the Data Blocks of any DUNS could not be refreshed raises and is left unacknowledged.
+        Returns a dataframe of the consumed notifications with the notification_schema.
         """
 
-        endpoint = f"{self._api_url}/match/cleanseMatch?"
-        params = {
-            "candidateMaximumQuantity": 1,
-            "name": record["name"],
-            "streetAddressLine1": record["streetaddress"],
-            "street&addressLocality": record["city"],
-            "addressRegion": record["state"],
-            "postalCode": record["postal_code"],
-            "countryISOAlpha2Code": record["country"],
-        }
+        blocks = list(blocks if blocks is not None else self.data_blocks)
+        if data_path is not None and not blocks:
+            raise ValueError("At least one Data Block ID needs to be requested.")
 
-        payload = {}
-        headers = {
-            "Authorization": f"Bearer {self._session_token}",
-        }
-        params = urllib.parse.urlencode(params)
-        url2 = endpoint + params
+        def apply(notifications):
+            if match_path is not None:
+                updates = self._notification_updates(notifications)
+                if updates:
+                    self._merge_match_updates(match_path, updates)
+
+            if data_path is not None:
+                changed_duns = sorted(
+                    {
+                        notification["organization"]["duns"]
+                        for notification in notifications
+                        if notification.get("type") in REFRESH_NOTIFICATION_TYPES
+                        and notification.get("organization", {}).get("duns")
+                    }
+                )
+                refreshed = self._merge_data_blocks(
+                    data_path, changed_duns, blocks, max_workers
+                )
+                self.logger.info(
+                    f"Refreshed the Data Blocks of {refreshed} of {len(changed_duns)} changed DUNS."
+                )
+                if refreshed < len(changed_duns):
+                    # Leaves the round unacknowledged, so its notifications are delivered again
+                    raise RuntimeError(
+                        f"The Data Blocks of {len(changed_duns) - refreshed} changed DUNS could not be refreshed."
+                    )
 
-        response = requests.request("GET", url2, headers=headers, data=payload)
-        json_resp = response.json()
+        consumed = self._consume_notifications(
+            reg_id, apply, max_notifications, concurrency
+        )
 
-        return json_resp
+        return self._create_dataframe(consumed, schema=self.notification_schema)
 
-    def match_and_cleanse(self, input_df, minimum_confidence: int | None = None):
+    def _consume_notifications(
+        self, reg_id: str, apply, max_notifications: int, concurrency: int
+    ) -> list[dict]:
         """
-        This method updates two object properties with dataframes. The first is a list of all the records that have a match confidence score of defined by the user (default is 7) or higher. The second is a list of all the records that have a match confidence score lower than the user defined score.
+        Pulls every pending notification of a registration, calls apply with each round of notifications in delivery
+        order and acknowledges the round once apply returns. An error raised by apply stops the run with the round
+        unacknowledged. Returns the consumed notifications as dicts in the NOTIFICATION_FIELDS layout.
         """
-
-        if minimum_confidence is None:
-            minimum_confidence = self.minimum_confidence
-
-        # check input minimum confidence value
-        if minimum_confidence > 10:
-            raise Exception(
-                "The minimum confidence needs to be a number between 1 and 10"
+        consumed = []
+        for batches in self.iter_monitoring_notifications(
+            reg_id, max_notifications, concurrency
+        ):
+            apply(
+                sorted(
+                    (notification for _, batch in batches for notification in batch),
+                    key=lambda notification: notification.get("deliveryTimeStamp")
+                    or "",
+                )
             )
 
-        matched_records_list = []
-        data_collect = input_df.collect()
-        for row in data_collect:
-            results = self.match_dnb(row)
-            input_data = results["inquiryDetail"]
-            for match in results["matchCandidates"]:
-                t = match["organization"]
-                # set the accepted value
-                if (
-                    match["matchQualityInformation"]["confidenceCode"]
-                    >= minimum_confidence
-                ):
-                    accepted = True
-                else:
-                    accepted = False
-                # create the dictionary of results
-                matched_cos = {
-                    "update_date": date.today(),
-                    "input_id": row["source_id"],
-                    "input_company_name": row["name"],
-                    "input_streetaddress": row["streetaddress"],
-                    "input_city": row["city"],
-                    "input_country": row["country"],
-                    "dnb_duns": t["duns"],
-                    "dnb_name": t["primaryName"],
-                    "dnb_streetaddress": t["primaryAddress"]["streetAddress"].get(
-                        "line1", None
-                    ),
-                    "dnb_city": t["primaryAddress"]["addressLocality"].get(
-                        "name", None
-                    ),
-                    "dnb_country": t["primaryAddress"]["addressCountry"].get(
-                        "isoAlpha2Code", None
-                    ),
-                    "dnb_status": t["dunsControlStatus"]["operatingStatus"][
-                        "description"
-                    ],
-                    "dnb_confidenceCode": match["matchQualityInformation"][
-                        "confidenceCode"
-                    ],
-                    "accepted": accepted,
-                    "dnb_nameMatchScore": match["matchQualityInformation"][
-                        "nameMatchScore"
-                    ],
-                    "dnb_matchgradeComponents": match["matchQualityInformation"][
-                        "matchGradeComponents"
-                    ],
-                    "dnb_matchDataProfileComponents": match["matchQualityInformation"][
-                        "matchDataProfileComponents"
-                    ],
+            for transaction_id, _ in batches:
+                try:
+                    self._ack_notifications(reg_id, transaction_id)
+                except (DnbApiError, requests.RequestException) as error:
+                    self.logger.warning(
+                        f"Could not acknowledge the notifications of transaction {transaction_id}, "
+                        f"they will be delivered again: {error}"
+                    )
+            consumed.extend(
+                {
+                    "transaction_id": transaction_id,
+                    "duns": notification.get("organization", {}).get("duns"),
+                    "type": notification.get("type"),
+                    "elements": json.dumps(notification.get("elements", [])),
+                    "delivered_at": notification.get("deliveryTimeStamp"),
                 }
-                matched_records_list.append(matched_cos)
+                for transaction_id, batch in batches
+                for notification in batch
+            )
 
         self.logger.info(
-            f"All records have been processed.\nThe result set is {len(matched_records_list)} records."
+            f"Applied {len(consumed)} notifications of registration {reg_id}."
         )
 
-        return self.spark.createDataFrame(matched_records_list, schema=self.schema)
+        return consumed
 
-    def export_monitoring_registrations(self, reg_id: str):
+    def consume_monitoring_notifications(
+        self,
+        reg_id: str,
+        apply=None,
+        max_notifications: int = 100,
+        concurrency: int = 4,
+        output: str = "records",
+    ):
         """
-        This method will add the input dataframe to the monitoring endpoint. The reg_id is the unique identifier for the monitoring endpoint
+        Spark-free counterpart of apply_monitoring_notifications. Every round of pulled notifications is passed
+        to apply, when given, before it is acknowledged. Returns the consumed notifications in the
+        notification_schema layout as a list of dicts, or as a pandas DataFrame or pyarrow Table when output is
+        "pandas" or "arrow".
         """
+        consumed = self._consume_notifications(
+            reg_id,
+            apply if apply is not None else (lambda notifications: None),
+            max_notifications,
+            concurrency,
+        )
 
-        endpoint = f"{self._api_url}/monitoring/registrations/{reg_id}/subjects"
-        payload = {}
-        headers = {
-            "Authorization": f"Bearer {self._session_token}",
+        return _output_records(consumed, NOTIFICATION_FIELDS, output)
+
+    def _register_duns(self, reg_id: str, duns: str) -> dict:
+        """
+        Adds one DUNS to a monitoring registration and returns its outcome.
+        """
+        endpoint = f"{self._api_url}/monitoring/registrations/{reg_id}/duns/{duns}"
+        outcome = {"duns": duns, "action": "add", "status": "failed"}
+
+        try:
+            response = self._request("POST", endpoint, label="monitoring.add")
+            json_resp = _parse_response(response)
+        except (requests.RequestException, ValueError) as error:
+            self.logger.warning(f"Could not add {duns} to monitoring: {error}")
+            return {**outcome, "message": str(error)}
+
+        error = json_resp.get("error", {})
+        information = json_resp.get("information", {})
+        # Check for 'error' key and the specific error message
+        if error.get("errorCode") == "21012":
+            status = "already_registered"
+        elif information.get("code") == "21113":
+            status = "added"
+        else:
+            status = "failed"
+
+        return {
+            **outcome,
+            "status": status,
+            "code": _optional_str(error.get("errorCode", information.get("code"))),
+            "message": error.get("errorMessage", information.get("message")),
         }
-        response = requests.request("GET", endpoint, headers=headers)
-        json_resp = response.json()
 
-        self.logger.info(json_resp)
+    def _unregister_duns(self, reg_id: str, duns: str) -> dict:
+        """
+        Removes one DUNS from a monitoring registration and returns its outcome.
+        """
+        endpoint = f"{self._api_url}/monitoring/registrations/{reg_id}/duns/{duns}"
+        outcome = {"duns": duns, "action": "remove", "status": "failed"}
+
+        try:
+            response = self._request("DELETE", endpoint, label="monitoring.remove")
+            json_resp = _parse_response(response)
+        except (requests.RequestException, ValueError) as error:
+            self.logger.warning(f"Could not delete {duns} from monitoring: {error}")
+            return {**outcome, "message": str(error)}
+
+        error = json_resp.get("error", {})
+        information = json_resp.get("information", {})
+        return {
+            **outcome,
+            "status": "failed" if response.status_code >= 400 else "removed",
+            "code": _optional_str(error.get("errorCode", information.get("code"))),
+            "message": error.get("errorMessage", information.get("message")),
+        }
 
-    def add_to_monitoring(self, duns: str | list[str], reg_id: str) -> None:
+    def add_to_monitoring(
+        self, duns: str | list[str], reg_id: str, max_workers: int | None = None
+    ) -> None:
         """
         This method will add the input dataframe to the monitoring endpoint. The reg_id is the unique identifier for the monitoring endpoint
+        With max_workers greater than one the DUNS are registered concurrently under the client rate limiter.
         """
 
         assert isinstance(duns, str) or (
@@ -258,39 +3245,31 @@ class Client:
 
         duns_list = duns if isinstance(duns, list) else [duns]
 
-        already_registered_count = 0
-        successfully_added_count = 0
-
-        for duns in duns_list:
-            endpoint = f"{self._api_url}/monitoring/registrations/{reg_id}/duns/{duns}"
-            payload = {}
-            headers = {
-                "Authorization": f"Bearer {self._session_token}",
-            }
-            url2 = endpoint
-
-            response = requests.request("POST", url2, headers=headers)
-            json_resp = response.json()
-            # Check for 'error' key and the specific error message
-            if "error" in json_resp and json_resp["error"].get("errorCode") == "21012":
-                already_registered_count += 1
-            elif (
-                "information" in json_resp
-                and json_resp["information"].get("code") == "21113"
-            ):
-                successfully_added_count += 1
+        outcomes = self._map_rows(
+            lambda duns: self._register_duns(reg_id, duns), duns_list, max_workers
+        )
+        statuses = [outcome["status"] for outcome in outcomes if outcome]
+        already_registered_count = statuses.count("already_registered")
+        successfully_added_count = statuses.count("added")
+        failed_count = (
+            len(duns_list) - already_registered_count - successfully_added_count
+        )
 
         message = (
             f"Processed {already_registered_count + successfully_added_count} records.\n"
             f"{already_registered_count} were already registered.\n"
-            f"{successfully_added_count} were successfully added to monitoring."
+            f"{successfully_added_count} were successfully added to monitoring.\n"
+            f"{failed_count} failed."
         )
 
         self.logger.info(message)
 
-    def delete_from_monitoring(self, duns: str | list[str], reg_id):
+    def delete_from_monitoring(
+        self, duns: str | list[str], reg_id, max_workers: int | None = None
+    ):
         """
         This method will delete the input dataframe to the monitoring endpoint. The reg_id is the unique identifier for the monitoring endpoint
+        With max_workers greater than one the DUNS are removed concurrently under the client rate limiter.
         """
 
         assert isinstance(duns, str) or (
@@ -299,63 +3278,319 @@ class Client:
 
         duns_list = duns if isinstance(duns, list) else [duns]
 
-        for duns in duns_list:
-            endpoint = f"{self._api_url}/monitoring/registrations/{reg_id}/duns/{duns}"
-            payload = {}
-            headers = {
-                "Authorization": f"Bearer {self._session_token}",
-            }
-            url2 = endpoint
+        outcomes = self._map_rows(
+            lambda duns: self._unregister_duns(reg_id, duns), duns_list, max_workers
+        )
+        removed_count = sum(
+            1 for outcome in outcomes if outcome and outcome["status"] == "removed"
+        )
+
+        self.logger.info(
+            f"Processed {len(duns_list)} records.\n"
+            f"{removed_count} were removed from monitoring.\n"
+            f"{len(duns_list) - removed_count} failed."
+        )
+
+    def _registration_duns(self, reg_id: str, page_size: int = 1000) -> set[str]:
+        """
+        Returns the DUNS currently registered in a monitoring registration.
+        """
+        return {
+            subject["duns"] if isinstance(subject, dict) else subject
+            for subjects in self.iter_monitoring_subject_pages(reg_id, page_size)
+            for subject in subjects
+        }
+
+    def sync_monitoring(
+        self,
+        reg_id: str,
+        desired_duns_df,
+        duns_column: str = "dnb_duns",
+        remove: bool = True,
+        max_workers: int | None = None,
+    ):
+        """
+        Makes a monitoring registration hold exactly the DUNS of desired_duns_df.
+        The current registration set is fetched once and the adds and removes are computed in Spark, so DUNS that are
+        already registered cost no API call. The changes are applied concurrently under the client rate limiter.
+        With remove unset DUNS missing from desired_duns_df stay registered.
+        Returns a dataframe of per-DUNS outcomes with the monitoring_schema.
+        """
+
+        current_df = self._create_dataframe(
+            [(duns,) for duns in self._registration_duns(reg_id)], schema="duns string"
+        )
+        desired_df = (
+            desired_duns_df.select(F.col(duns_column).cast("string").alias("duns"))
+            .where(F.col("duns").isNotNull())
+            .distinct()
+        )
+
+        to_add = [
+            row["duns"]
+            for row in desired_df.join(current_df, "duns", "left_anti").collect()
+        ]
+        to_remove = (
+            [
+                row["duns"]
+                for row in current_df.join(desired_df, "duns", "left_anti").collect()
+            ]
+            if remove
+            else []
+        )
+
+        outcomes = self._map_rows(
+            lambda duns: self._register_duns(reg_id, duns), to_add, max_workers
+        ) + self._map_rows(
+            lambda duns: self._unregister_duns(reg_id, duns), to_remove, max_workers
+        )
+        outcomes_df = self._create_dataframe(
+            [outcome for outcome in outcomes if outcome],
+            schema=self.monitoring_schema,
+        )
+        unchanged_df = desired_df.join(current_df, "duns").select(
+            "duns",
+            F.lit("none").alias("action"),
+            F.lit("unchanged").alias("status"),
+            F.lit(None).cast("string").alias("code"),
+            F.lit(None).cast("string").alias("message"),
+        )
+
+        self.logger.info(
+            f"Monitoring registration {reg_id} has been synced.\n"
+            f"{len(to_add)} DUNS were added and {len(to_remove)} were removed."
+        )
+
+        return outcomes_df.unionByName(unchanged_df)
+
+    def _fetch_data_blocks(
+        self, duns: str, blocks: list[str], refresh: bool = False
+    ) -> dict:
+        """
+        Returns the Data Blocks response of one DUNS. Blocks found in the data cache are not requested again,
+        the remaining blocks are fetched in a single call and the responses are merged oldest first, so the
+        newest copy of a field always wins. With refresh set every block is downloaded and the cache entries are replaced.
+        """
+        cache_keys = {
+            block: _cache_key("data", {"duns": duns, "blockID": block})
+            for block in blocks
+        }
+        responses = []
+        missing_blocks = []
+        for block in blocks:
+            cached = (
+                self.data_cache.lookup_entry(cache_keys[block])
+                if self.data_cache is not None and not refresh
+                else None
+            )
+            if cached is None:
+                missing_blocks.append(block)
+            else:
+                responses.append((cached[1], cached[0]))
+
+        if missing_blocks:
+            endpoint = f"{self._api_url}/data/duns/{duns}"
+            response = self._request(
+                "GET",
+                endpoint,
+                label="data",
+                params={"blockIDs": ",".join(missing_blocks)},
+            )
+            if response.status_code >= 400:
+                raise DnbApiError.from_response(response)
+            json_resp = _parse_response(response)
+            if self.data_cache is not None:
+                for block in missing_blocks:
+                    self.data_cache.store(cache_keys[block], json_resp)
+            responses.append((time.time(), json_resp))
+
+        if len(responses) == 1:
+            return responses[0][1]
 
-            response = requests.request("DELETE", url2, headers=headers)
-            json_resp = response.json()
-            self.logger.info(endpoint)
-            self.logger.info(json_resp)
+        merged = {}
+        organization = {}
+        block_status = {}
+        for _, json_resp in sorted(responses, key=lambda response: response[0]):
+            merged.update(json_resp)
+            organization.update(json_resp.get("organization", {}))
+            for status in json_resp.get("blockStatus", []):
+                block_status[status.get("blockID")] = status
+        merged["organization"] = organization
+        merged["blockStatus"] = [
+            block_status[block] for block in blocks if block in block_status
+        ]
+        if "inquiryDetail" in merged:
+            merged["inquiryDetail"] = {**merged["inquiryDetail"], "blockIDs": blocks}
+        return merged
 
-    def append_data(self, input_df):
+    def append_data(
+        self,
+        input_df,
+        blocks: list[str] | None = None,
+        duns_column: str = "dnb_duns",
+        max_workers: int | None = None,
+    ):
         """
         This method will use the input dataframe and call the Data Blocks API endpoint then store the data.
+        blocks lists the Data Block IDs with their level and version, e.g. ["companyinfo_L2_v1"], and defaults to data_blocks.
+        Each distinct DUNS is fetched once, concurrently with max_workers under the client rate limiter, and blocks that are
+        fresh in data_cache are not downloaded again. Returns a dataframe with the append_schema.
         """
 
-        count = 0
-        append_records_list = []
+        blocks = list(blocks if blocks is not None else self.data_blocks)
+        if not blocks:
+            raise ValueError("At least one Data Block ID needs to be requested.")
 
-        for row in input_df.collect():
-            duns = row["dnb_duns"]
-            """
-            Each ###BLOCK### needs to be replaced with client-specific Data Blocks, i.e., companyinfo_L2_v1
-            """
-            endpoint = f"{self._api_url}/data/duns/{duns}?blockIDs=###BLOCK###%2C###BLOCK###%2C###BLOCK###"
-            payload = {}
-            headers = {
-                "Authorization": f"Bearer {self._session_token}",
-            }
-            url2 = endpoint
+        duns_list = [
+            row["duns"]
+            for row in input_df.select(F.col(duns_column).cast("string").alias("duns"))
+            .where(F.col("duns").isNotNull())
+            .distinct()
+            .collect()
+        ]
 
-            response = requests.request("GET", url2, headers=headers)
-            json_resp = response.json()
-            count += 1
-            append_cos = {
-                "update_date": date.today(),
+        cache_stats = self.data_cache.stats() if self.data_cache is not None else None
+        if self.data_cache is not None:
+            self.data_cache.prefetch(
+                [
+                    _cache_key("data", {"duns": duns, "blockID": block})
+                    for duns in duns_list
+                    for block in blocks
+                ]
+            )
+        today = date.today()
+        results = self._map_rows(
+            lambda duns: self._fetch_data_blocks(duns, blocks), duns_list, max_workers
+        )
+        append_records_list = [
+            {
+                "update_date": today,
                 "D-U-N-S_NUMBER": duns,
-                "append_data": json_resp,
+                "block_ids": blocks,
+                "append_data": json.dumps(json_resp),
             }
+            for duns, json_resp in zip(duns_list, results)
+            if json_resp is not None
+        ]
+        self._log_cache_stats(
+            cache_stats, self.data_cache, "Data Blocks", "Data Blocks"
+        )
 
-            append_records_list.append(append_cos)
-
-        self.appended_records = self.spark.createDataFrame(
-            append_records_list, schema=self.schema
+        appended_records = self._create_dataframe(
+            append_records_list, self.append_schema
         )
-        # message = (f"Processed {count} records."
+        object.__setattr__(self, "appended_records", appended_records)
 
         self.logger.info(
             f"All records have been processed.\nThe result set is {len(append_records_list)} records which can be accessed using the appended_records object property"
+            f"\n{results.count(None)} DUNS failed and were skipped."
+        )
+
+        return appended_records
+
+    @staticmethod
+    def _field_type(schema, path: str):
+        """
+        Resolves the data type of a dotted field path in a schema, or None when the path does not exist.
+        Paths that go through an array resolve to an array of the nested field, as Spark does.
+        """
+        data_type = schema
+        through_array = False
+        for name in path.split("."):
+            while isinstance(data_type, T.ArrayType):
+                data_type = data_type.elementType
+                through_array = True
+            if not isinstance(data_type, T.StructType) or name not in data_type.names:
+                return None
+            data_type = data_type[name].dataType
+
+        return T.ArrayType(data_type) if through_array else data_type
+
+    def flatten_data_blocks(
+        self,
+        appended_df,
+        block_fields: dict[str, list[str]],
+        path: str | None = None,
+        format: str = "parquet",
+        sampling_ratio: float = 1.0,
+    ) -> dict:
+        """
+        Flattens the Data Blocks JSON returned by append_data into typed columnar tables.
+        block_fields maps each block ID to the dotted field paths to keep, e.g.
+        {"companyinfo_L2_v1": ["organization.primaryName", "organization.numberOfEmployees"]}.
+        A typed schema is inferred per block from the stored documents. Scalar and struct fields become columns of a
+        <block ID> table keyed by duns, array fields are exploded into <block ID>__<field> child tables keyed by duns.
+        With path set every table is written to <path>/<table name>. Returns the tables by name.
+        """
+
+        documents_df = appended_df.select(
+            F.col("`D-U-N-S_NUMBER`").alias("duns"), "block_ids", "append_data"
         )
+        tables = {}
+
+        for block, fields in block_fields.items():
+            block_df = documents_df.where(F.array_contains("block_ids", block))
+            block_schema = self.spark.read.json(
+                block_df.select("append_data").rdd.map(lambda row: row[0]),
+                samplingRatio=sampling_ratio,
+            ).schema
+            parsed_df = block_df.select(
+                "duns", F.from_json("append_data", block_schema).alias("document")
+            )
+
+            columns = []
+            for field in fields:
+                field_type = self._field_type(block_schema, field)
+                column = F.col(f"document.{field}")
+                name = field.replace(".", "_")
 
-    def adv_match_and_cleanse(self, input_df, minimum_confidence: int | None = None):
+                if field_type is None:
+                    self.logger.warning(
+                        f"Field {field} was not found in the {block} documents and is skipped."
+                    )
+                elif isinstance(field_type, T.ArrayType):
+                    child_df = parsed_df.select(
+                        "duns", F.explode_outer(column).alias("item")
+                    )
+                    if isinstance(field_type.elementType, T.StructType):
+                        child_df = child_df.select("duns", "item.*")
+                    tables[f"{block}__{name}"] = child_df
+                else:
+                    columns.append(column.alias(name))
+
+            tables[block] = parsed_df.select("duns", *columns)
+
+        if path is not None:
+            for name, table_df in tables.items():
+                table_df.write.format(format).mode("overwrite").save(
+                    f"{path.rstrip('/')}/{name}"
+                )
+
+        return tables
+
+    def adv_match_and_cleanse(
+        self,
+        input_df,
+        minimum_confidence: int | None = None,
+        max_workers: int | None = None,
+        distributed: bool = False,
+        deduplicate: bool = False,
+        archive: str | None = None,
+        sink: str | None = None,
+        chunk_size: int = 1000,
+        sink_format: str = "parquet",
+    ):
         """
         Processes each row in the input dataframe by matching it against D&B records
         and storing results with match details and confidence scores.
+        With max_workers greater than one the rows are matched concurrently, the output keeps the input order.
+        With distributed set the rows are matched on the executors and the input is never collected on the driver,
+        it cannot be combined with a match cache or match index.
+        With deduplicate set the API is called once per distinct normalized company and the results are joined
+        back to every original source_id. Name and postcode flags are then computed from the first row of each company.
+        With archive set to a path the raw cleanseMatch responses are appended there, see rescore.
+        With sink set to a path the results are flushed there every chunk_size records with a progress checkpoint,
+        a restarted run resumes after the source_ids already done.
         """
 
         if minimum_confidence is None:
@@ -364,50 +3599,150 @@ class Client:
         if not (1 <= minimum_confidence <= 10):
             raise ValueError("Minimum confidence must be between 1 and 10.")
 
-        matched_records_list = []
-        today = date.today()
+        if deduplicate:
+            distinct_df, duplicates_df = self._deduplicate_input(input_df)
+            matched_df = self.adv_match_and_cleanse(
+                distinct_df,
+                minimum_confidence,
+                max_workers,
+                distributed,
+                archive=archive,
+                sink=sink,
+                chunk_size=chunk_size,
+                sink_format=sink_format,
+            )
+            return self._expand_duplicates(matched_df, duplicates_df)
 
-        for row in input_df.collect():
-            results = self.match_dnb(row)
-            for match in results.get("matchCandidates", []):
-                org = match["organization"]
-                addr = org["primaryAddress"]
-                addr_locality = addr.get("addressLocality", {})
-                addr_country = addr.get("addressCountry", {})
-                confidence = match["matchQualityInformation"]["confidenceCode"]
-                processed_match = self.processMatch(match, row)
-
-                matched_cos = {
-                    "update_date": today,
-                    "input_id": row["source_id"],
-                    "input_company_name": row["name"],
-                    "input_streetaddress": row["streetaddress"],
-                    "input_city": row["city"],
-                    "input_country": row["country"],
-                    "dnb_duns": org.get("duns"),
-                    "dnb_name": org.get("primaryName"),
-                    "dnb_streetaddress": addr.get("streetAddress", {}).get("line1"),
-                    "dnb_city": addr_locality.get("name"),
-                    "dnb_country": addr_country.get("isoAlpha2Code"),
-                    "dnb_status": org.get("dunsControlStatus", {})
-                    .get("operatingStatus", {})
-                    .get("description"),
-                    "dnb_confidenceCode": confidence,
-                    "accepted": confidence >= minimum_confidence,
-                    "dnb_nameMatchScore": match["matchQualityInformation"].get(
-                        "nameMatchScore"
-                    ),
-                    # "dnb_matchgradeComponents": match["matchQualityInformation"].get("matchGradeComponents"),
-                    # "dnb_matchDataProfileComponents": match["matchQualityInformation"].get("matchDataProfileComponents"),
-                }
+        if distributed:
+            self._check_driver_only(archive, sink)
+            return self._distributed_match(
+                input_df, True, minimum_confidence, max_workers
+            )
 
-                matched_records_list.append({**processed_match, **matched_cos})
+        if sink is not None:
+            return self._chunked_match(
+                input_df,
+                True,
+                minimum_confidence,
+                max_workers,
+                archive,
+                sink,
+                chunk_size,
+                sink_format,
+            )
+
+        matched_records_list, failed_rows = self._match_and_archive(
+            input_df.collect(), True, minimum_confidence, max_workers, archive
+        )
 
         self.logger.info(
             f"All records have been processed.\nThe result set contains {len(matched_records_list)} records and can be accessed via the matched_records object property."
+            f"\n{len(failed_rows)} input records failed and were skipped."
+        )
+
+        return self._create_dataframe(matched_records_list, self.schema)
+
+    def stream_match(
+        self,
+        stream_df,
+        sink: str,
+        checkpoint_location: str,
+        minimum_confidence: int | None = None,
+        advanced: bool = True,
+        max_workers: int | None = None,
+        sink_format: str = "delta",
+        trigger: dict | None = None,
+    ):
+        """
+        Continuously matches a streaming dataframe of suppliers with Structured Streaming and returns the StreamingQuery.
+        Every micro-batch is matched on the driver through foreachBatch under the client rate limiter, which is shared
+        by all micro-batches, and written to the sink in the Client.schema layout.
+        Delta sinks are written idempotently with txnAppId/txnVersion so a replayed micro-batch is not written twice.
+        Other formats get one batch_id=<id> partition per micro-batch that is overwritten on replay.
+        trigger is passed to DataStreamWriter.trigger, e.g. {"processingTime": "10 seconds"}.
+        """
+
+        if minimum_confidence is None:
+            minimum_confidence = self.minimum_confidence
+
+        if not (1 <= minimum_confidence <= 10):
+            raise ValueError("Minimum confidence must be between 1 and 10.")
+
+        # Stable across restarts of the same query, so Delta recognizes replayed batches
+        app_id = hashlib.sha256(checkpoint_location.encode("utf-8")).hexdigest()
+
+        def process_batch(batch_df, batch_id):
+            matched_records_list, failed_rows = self._match_rows(
+                batch_df.collect(), advanced, minimum_confidence, max_workers
+            )
+            result_df = self._create_dataframe(matched_records_list, self.schema)
+
+            if sink_format == "delta":
+                result_df.write.format("delta").mode("append").option(
+                    "txnAppId", app_id
+                ).option("txnVersion", batch_id).save(sink)
+            else:
+                result_df.write.format(sink_format).mode("overwrite").save(
+                    f"{sink.rstrip('/')}/batch_id={batch_id}"
+                )
+
+            self.logger.info(
+                f"Micro-batch {batch_id} has been processed.\nThe result set is {len(matched_records_list)} records."
+                f"\n{len(failed_rows)} input records failed and were skipped."
+            )
+
+        writer = stream_df.writeStream.foreachBatch(process_batch).option(
+            "checkpointLocation", checkpoint_location
         )
+        if trigger is not None:
+            writer = writer.trigger(**trigger)
+
+        return writer.start()
+
+    def _adv_match_records(
+        self, row, results, minimum_confidence: int, today: date
+    ) -> list[dict]:
+        """
+        Returns the result dictionaries used by adv_match_and_cleanse for a single input row.
+        """
+        matched_records_list = []
+        for match in results.get("matchCandidates", []):
+            org = match["organization"]
+            addr = org["primaryAddress"]
+            addr_locality = addr.get("addressLocality", {})
+            addr_country = addr.get("addressCountry", {})
+            confidence = match["matchQualityInformation"]["confidenceCode"]
+            start = time.perf_counter()
+            processed_match = self.processMatch(match, row)
+            self.metrics.timing("processMatch", time.perf_counter() - start)
 
-        return self.spark.createDataFrame(matched_records_list, schema=self.schema)
+            matched_cos = {
+                "update_date": today,
+                "input_id": row["source_id"],
+                "input_company_name": row["name"],
+                "input_streetaddress": row["streetaddress"],
+                "input_city": row["city"],
+                "input_country": row["country"],
+                "dnb_duns": org.get("duns"),
+                "dnb_name": org.get("primaryName"),
+                "dnb_streetaddress": addr.get("streetAddress", {}).get("line1"),
+                "dnb_city": addr_locality.get("name"),
+                "dnb_country": addr_country.get("isoAlpha2Code"),
+                "dnb_status": org.get("dunsControlStatus", {})
+                .get("operatingStatus", {})
+                .get("description"),
+                "dnb_confidenceCode": confidence,
+                "accepted": confidence >= minimum_confidence,
+                "dnb_nameMatchScore": match["matchQualityInformation"].get(
+                    "nameMatchScore"
+                ),
+                # "dnb_matchgradeComponents": match["matchQualityInformation"].get("matchGradeComponents"),
+                # "dnb_matchDataProfileComponents": match["matchQualityInformation"].get("matchDataProfileComponents"),
+            }
+
+            matched_records_list.append({**processed_match, **matched_cos})
+
+        return matched_records_list
 
     def processMatch(self, record, input_record):
         """
@@ -430,41 +3765,11 @@ class Client:
 
         # Parse matchGrade
         matchGrade = match_quality.get("matchGrade", "").ljust(11, "F")
-        mg_keys = [
-            "MG_Name",
-            "MG_StreetNumber",
-            "MG_StreetName",
-            "MG_City",
-            "MG_State",
-            "MG_PObox",
-            "MG_Phone",
-            "MG_PostCode",
-            "MG_Density",
-            "MG_Uniqueness",
-            "MG_SIC",
-        ]
-        mg_dict = dict(zip(mg_keys, list(matchGrade)))
+        mg_dict = dict(zip(MATCH_GRADE_KEYS, matchGrade))
 
         # Parse matchDataProfile
         mdp = match_quality.get("matchDataProfile", "").ljust(28, "F")
-        mdp_keys = [
-            "MDP_Name",
-            "MDP_StreetNumber",
-            "MDP_StreetName",
-            "MDP_City",
-            "MDP_State",
-            "MDP_PObox",
-            "MDP_Phone",
-            "MDP_PostCode",
-            "MDP_DUNS",
-            "MDP_SIC",
-            "MDP_Density",
-            "MDP_Uniqueness",
-            "MDP_NationalID",
-            "MDP_URL",
-        ]
-        mdp_values = [mdp[i : i + 2] for i in range(0, 28, 2)]
-        mdp_dict = dict(zip(mdp_keys, mdp_values))
+        mdp_dict = {key: mdp[i : i + 2] for i, key in MATCH_DATA_PROFILE_SLICES}
 
         # Logic flags
         isPrimary = mdp_dict["MDP_Name"] in ("00", "01")
@@ -589,3 +3894,255 @@ class Client:
         }
 
         return result
+
+    def rescore(
+        self, archive, minimum_confidence: int | None = None, advanced: bool = True
+    ):
+        """
+        Rebuilds the Client.schema dataframe from archived raw responses without calling the API,
+        so a new minimum_confidence or new processMatch rules can be applied to a past run.
+        archive is the archive path or an already loaded dataframe, the latest response per source_id is used.
+        """
+
+        if minimum_confidence is None:
+            minimum_confidence = self.minimum_confidence
+
+        if not (1 <= minimum_confidence <= 10):
+            raise ValueError("Minimum confidence must be between 1 and 10.")
+
+        archive_df = (
+            self.spark.read.parquet(archive) if isinstance(archive, str) else archive
+        )
+        latest = Window.partitionBy("source_id").orderBy(F.col("archived_at").desc())
+        archive_df = (
+            archive_df.withColumn("_archive_rank", F.row_number().over(latest))
+            .filter(F.col("_archive_rank") == 1)
+            .drop("_archive_rank")
+        )
+
+        rescore_partition = partial(
+            _rescore_partition,
+            type(self),
+            advanced,
+            minimum_confidence,
+            self.schema.fieldNames(),
+        )
+
+        return self._create_dataframe(
+            archive_df.rdd.mapPartitions(rescore_partition), schema=self.schema
+        )
+
+    def _rescore_rows(self, rows, advanced: bool, minimum_confidence: int):
+        """
+        Generator over the result dictionaries rebuilt from archive rows, without any network I/O.
+        """
+        for row in rows:
+            records = self._build_match_records(
+                json.loads(row["input"]),
+                json.loads(zlib.decompress(row["response"])),
+                advanced,
+                minimum_confidence,
+                row["archived_at"].date(),
+            )
+            yield from records
+
+    def rescore_records(
+        self,
+        archive,
+        minimum_confidence: int | None = None,
+        advanced: bool = True,
+        output: str = "records",
+    ):
+        """
+        Spark-free rescore. archive is an iterable of archive entries, as tuples in the ARCHIVE_FIELDS order
+        (see match_records) or as mappings, and every entry is rebuilt. Returns the results like match_records.
+        """
+
+        if minimum_confidence is None:
+            minimum_confidence = self.minimum_confidence
+
+        if not (1 <= minimum_confidence <= 10):
+            raise ValueError("Minimum confidence must be between 1 and 10.")
+
+        names = [field[0] for field in ARCHIVE_FIELDS]
+        rows = (
+            dict(zip(names, entry)) if type(entry) is tuple else _row_dict(entry)
+            for entry in archive
+        )
+
+        return _output_records(
+            list(self._rescore_rows(rows, advanced, minimum_confidence)),
+            MATCH_FIELDS,
+            output,
+        )
+
+    def build_match_index(self, archive, index: MatchIndex | None = None) -> int:
+        """
+        Loads the trusted matches of a raw response archive (see match_and_cleanse) into a MatchIndex,
+        the client's match_index by default. archive is the archive path or an already loaded dataframe,
+        the rows are streamed to the driver one partition at a time. Returns the number of entries added.
+        """
+        index = index if index is not None else self.match_index
+        if index is None:
+            raise ValueError("No match index given and the client has no match_index.")
+
+        archive_df = (
+            self.spark.read.parquet(archive) if isinstance(archive, str) else archive
+        )
+        added = 0
+        for row in archive_df.select("input", "response").toLocalIterator():
+            added += index.add(
+                json.loads(row["input"]),
+                json.loads(zlib.decompress(row["response"])),
+                commit=False,
+            )
+        index.flush()
+
+        self.logger.info(f"{added} trusted matches were added to the match index.")
+        return added
+
+    def score_matches(
+        self,
+        candidates_df,
+        match_grade: str = "matchGrade",
+        match_data_profile: str = "matchDataProfile",
+        name_match_score: str = "nameMatchScore",
+        match_grade_components_count: str = "matchGradeComponentsCount",
+        confidence_code: str = "confidenceCode",
+        input_name: str = "input_company_name",
+        input_postal_code: str = "input_postal_code",
+        dnb_name: str = "dnb_name",
+        dnb_country: str = "dnb_country",
+        dnb_postal_code: str = "dnb_postalCode",
+        registration_numbers: str = "registrationNumbers",
+    ):
+        """
+        Vectorized version of processMatch that runs as native Spark column expressions.
+        The candidates dataframe holds the stored matchGrade and matchDataProfile strings with the other inputs of
+        processMatch, the column names can be overridden through the arguments. registration_numbers is either
+        the array of registration numbers or a boolean. Returns the dataframe with the processMatch columns added,
+        in the same order and with the same values.
+        """
+        if registration_numbers in candidates_df.columns and isinstance(
+            candidates_df.schema[registration_numbers].dataType, T.ArrayType
+        ):
+            isRegistered = F.coalesce(F.size(registration_numbers) > 0, F.lit(False))
+        elif registration_numbers in candidates_df.columns:
+            isRegistered = F.coalesce(
+                F.col(registration_numbers).cast("boolean"), F.lit(False)
+            )
+        else:
+            isRegistered = F.lit(False)
+
+        nameMatchScore = F.coalesce(F.col(name_match_score), F.lit(0)).cast("double")
+        matchGradeComponentsCount = F.coalesce(
+            F.col(match_grade_components_count), F.lit(0)
+        ).cast("int")
+        confidenceCode = F.coalesce(F.col(confidence_code), F.lit(0)).cast("int")
+
+        matchGrade = F.rpad(F.coalesce(F.col(match_grade), F.lit("")), 11, "F")
+        mg = {
+            key: F.substring(matchGrade, i + 1, 1)
+            for i, key in enumerate(MATCH_GRADE_KEYS)
+        }
+        mdp_string = F.rpad(F.coalesce(F.col(match_data_profile), F.lit("")), 28, "F")
+        mdp = {
+            key: F.substring(mdp_string, i + 1, 2)
+            for i, key in MATCH_DATA_PROFILE_SLICES
+        }
+
+        # Logic flags, mirroring processMatch
+        isPrimary = mdp["MDP_Name"].isin("00", "01")
+        phoneMatch = mg["MG_Phone"] == "A"
+        isExec = mdp["MDP_Name"] == "03"
+        urlMatch = mdp["MDP_URL"] == "00"
+
+        exactName = F.coalesce(
+            F.upper(F.col(input_name))
+            == F.upper(F.coalesce(F.col(dnb_name), F.lit(""))),
+            F.lit(False),
+        )
+        strongName = ((nameMatchScore >= 60) & (matchGradeComponentsCount > 7)) | (
+            (nameMatchScore >= 70) & (matchGradeComponentsCount == 7)
+        )
+        closeName = mg["MG_Name"].isin("A", "B")
+        regNoMatch = ((mg["MG_Name"] == "Z") & (confidenceCode == 10)) | (
+            mdp["MDP_Name"] == "20"
+        )
+        postCodeMatch = F.col(input_postal_code).eqNullSafe(F.col(dnb_postal_code))
+
+        # Address match logic
+        valid_country = F.coalesce(F.col(dnb_country).isin("GB", "NL"), F.lit(False))
+        valid_street_number = mg["MG_StreetNumber"].isin("A", "B")
+        valid_street_name = mg["MG_StreetName"].isin("A", "B")
+        valid_city = mg["MG_City"].isin("A", "B")
+        valid_state = mg["MG_State"].isin("A", "B")
+        valid_postcode = mg["MG_PostCode"].isin("A", "B")
+        any_postcode = postCodeMatch | valid_postcode
+
+        addressMatchStrong = (
+            valid_country
+            & (
+                (valid_street_number & (postCodeMatch | valid_state))
+                | (valid_street_number & valid_city & any_postcode)
+                | (valid_street_number & valid_street_name & any_postcode)
+            )
+        ) | ((mg["MG_StreetNumber"] == "A") & (mg["MG_StreetName"] == "A") & valid_city)
+
+        addressMatchLoose = (
+            (valid_street_number & valid_street_name)
+            | (valid_street_number & valid_city)
+            | (valid_street_name & valid_city)
+            | (valid_street_number & valid_street_name & any_postcode)
+            | (valid_street_number & any_postcode)
+            | (valid_street_name & any_postcode)
+            | (valid_city & any_postcode)
+        )
+
+        # Custom match grade logic, the first matching rule wins as in processMatch
+        any_name_match = exactName | strongName | closeName
+        any_address_match = addressMatchStrong | addressMatchLoose
+        customMatchGrade = (
+            F.when(regNoMatch & any_name_match & any_address_match, "SIT1")
+            .when(exactName & any_address_match, "SIT2")
+            .when(regNoMatch & any_name_match, "REG1")
+            .when(strongName & any_address_match, "SIT3")
+            .when(closeName & addressMatchStrong, "SIT4")
+            .when((strongName | exactName) & phoneMatch, "CMP1")
+            .when(closeName & phoneMatch, "CMP2")
+            .when(exactName & isRegistered, "CMP3")
+            .when(exactName, "CMP4")
+            .when(strongName & (valid_city | valid_postcode), "CMP5")
+            .when(regNoMatch & ~any_name_match, "REG2")
+            .when(strongName, "CMP7")
+            .when(closeName, "CMP8")
+            .when(urlMatch, "URL1")
+            .when(any_address_match & ~any_name_match, "GEO1")
+            .otherwise("UNC")
+        )
+
+        scored = {
+            **mg,
+            **mdp,
+            "nameMatchScore": nameMatchScore,
+            "matchGradeComponentsCount": matchGradeComponentsCount,
+            "confidenceCode": confidenceCode,
+            "isPrimary": isPrimary,
+            "phoneMatch": phoneMatch,
+            "isExec": isExec,
+            "urlMatch": urlMatch,
+            "exactName": exactName,
+            "strongName": strongName,
+            "closeName": closeName,
+            "regNoMatch": regNoMatch,
+            "isRegistered": isRegistered,
+            "postCodeMatch": postCodeMatch,
+            "addressMatchStrong": addressMatchStrong,
+            "addressMatchLoose": addressMatchLoose,
+            "customMatchGrade": customMatchGrade,
+        }
+
+        return candidates_df.select(
+            *[name for name in candidates_df.columns if name not in scored],
+            *[column.alias(name) for name, column in scored.items()],
+        )
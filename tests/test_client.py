@@ -0,0 +1,198 @@
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from client import Client, MatchIndex, SQLiteMatchCache, TokenProvider
+from mock_server import MockDnbServer
+
+RECORDS = [
+    {
+        "source_id": source_id,
+        "name": f"Acme {source_id}",
+        "streetaddress": "1 High Street",
+        "city": "Leeds",
+        "state": None,
+        "postal_code": "LS1 4AB",
+        "country": "GB",
+    }
+    for source_id in range(1, 4)
+]
+
+
+@pytest.fixture
+def server():
+    with MockDnbServer() as mock:
+        yield mock
+
+
+def mock_client(server, **kwargs):
+    class MockClient(Client):
+        _api_url = f"{server.url}/v1"
+        _api_auth_url = f"{server.url}/v2/token"
+
+    return MockClient(None, "mock-key", "mock-secret", **kwargs)
+
+
+def test_match_records_with_cache_and_no_index(server):
+    client = mock_client(server, cache=SQLiteMatchCache(":memory:"))
+
+    first = client.match_records(RECORDS, minimum_confidence=1)
+    requests = server.request_count
+    second = client.match_records(RECORDS, minimum_confidence=1)
+
+    assert len(first) == len(RECORDS)
+    assert second == first
+    assert server.request_count == requests
+    assert client.cache.stats()["hits"] == len(RECORDS)
+
+
+def test_projected_match_keeps_full_body(server):
+    client = mock_client(
+        server, cache=SQLiteMatchCache(":memory:"), response_projection=True
+    )
+
+    results, body = client._match_dnb(RECORDS[0], keep_body=True)
+    cached, cached_body = client._match_dnb(RECORDS[0], keep_body=True)
+
+    assert "inquiryDetail" not in results
+    assert "inquiryDetail" in json.loads(body)
+    assert cached == results
+    assert json.loads(cached_body) == json.loads(body)
+
+
+def test_short_lived_token_is_reused():
+    responses = [{"access_token": "first", "expiresIn": 60}]
+    provider = TokenProvider(responses.pop, refresh_margin=300)
+
+    assert provider.token() == "first"
+    assert provider.token() == "first"
+
+
+def test_rescore_records_from_match_records_archive(server):
+    client = mock_client(server)
+    archive = []
+
+    matched = client.match_records(RECORDS, minimum_confidence=1, archive=archive)
+    requests = server.request_count
+    rescored = client.rescore_records(archive, minimum_confidence=1)
+
+    assert len(archive) == len(RECORDS)
+    assert server.request_count == requests
+    assert [record["input_id"] for record in rescored] == [
+        record["input_id"] for record in matched
+    ]
+
+
+def test_consume_monitoring_notifications(server):
+    client = mock_client(server)
+    server.queue_notifications(
+        "REG1",
+        [
+            {
+                "type": "UPDATE",
+                "organization": {"duns": "123456789"},
+                "elements": [],
+                "deliveryTimeStamp": "2026-01-01T00:00:00Z",
+            }
+        ],
+    )
+    rounds = []
+
+    consumed = client.consume_monitoring_notifications("REG1", rounds.append)
+
+    assert [record["duns"] for record in consumed] == ["123456789"]
+    assert len(rounds) == 1
+    assert client.consume_monitoring_notifications("REG1") == []
+
+
+def test_match_index_does_not_resolve_another_city():
+    index = MatchIndex(":memory:")
+    response = {
+        "matchCandidates": [
+            {
+                "organization": {"duns": "123456789"},
+                "matchQualityInformation": {"confidenceCode": 10},
+            }
+        ]
+    }
+    leeds = {
+        "name": "Tesco Stores Ltd",
+        "streetaddress": "1 High Street",
+        "city": "Leeds",
+        "postal_code": "LS1 4AB",
+        "country": "GB",
+    }
+    assert index.add(leeds, response)
+
+    assert index.lookup({**leeds, "postal_code": None}) is not None
+    assert index.lookup({**leeds, "city": "London", "postal_code": None}) is None
+    assert index.lookup({**leeds, "city": None, "postal_code": None}) is None
+
+
+def test_match_dnb_commits_match_index(server, tmp_path):
+    path = str(tmp_path / "match_index.db")
+    client = mock_client(server, match_index=MatchIndex(path, trusted_confidence=1))
+
+    client.match_dnb(RECORDS[0])
+
+    assert len(MatchIndex(path)) == 1
+
+
+def test_transient_token_error_does_not_revoke_credential(server):
+    client = mock_client(
+        server,
+        credentials=(("mock-key-2", "mock-secret"),),
+        max_retries=1,
+        backoff_factor=0.01,
+    )
+    # Both attempts of the first token request fail
+    server.token_errors = 2
+
+    client.match_records(RECORDS[:1], minimum_confidence=1)
+    client.match_records(RECORDS[1:], minimum_confidence=1)
+
+    assert not any(credential.revoked for credential in client._credentials.credentials)
+    assert set(server.key_requests) == {"mock-key", "mock-key-2"}
+
+
+def test_failed_notification_round_is_not_acknowledged(server):
+    client = mock_client(server)
+    server.queue_notifications(
+        "REG1", [{"type": "UPDATE", "organization": {"duns": "123456789"}}]
+    )
+
+    def apply(notifications):
+        raise RuntimeError("refresh failed")
+
+    with pytest.raises(RuntimeError):
+        client.consume_monitoring_notifications("REG1", apply)
+
+    assert len(server.pending_notifications) == 1
+
+
+def test_failed_notification_ack_is_logged(server, caplog):
+    client = mock_client(server)
+    server.queue_notifications(
+        "REG1", [{"type": "UPDATE", "organization": {"duns": "123456789"}}]
+    )
+
+    consumed = client.consume_monitoring_notifications(
+        "REG1", lambda notifications: server.pending_notifications.clear()
+    )
+
+    assert len(consumed) == 1
+    assert f"transaction {consumed[0]['transaction_id']}" in caplog.text
+    assert "Skipping input row" not in caplog.text
+
+
+def test_distributed_match_refuses_match_cache(server):
+    client = mock_client(server, cache=SQLiteMatchCache(":memory:"))
+
+    with pytest.raises(ValueError):
+        client.match_and_cleanse(None, distributed=True)